@@ -0,0 +1,37 @@
+import importlib
+import os
+import sys
+
+
+ANSWER_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# this directory's solution module, once imported
+answer_solution = None
+
+
+def import_answer(*names):
+    """
+    Imports the named modules from this directory, with this directory's
+    solution.py as the "solution" they import, and returns them in order.
+
+    ../test_solution.py imports the candidate's solution.py under the same
+    name, and pytest run from the parent directory collects these tests in
+    the same process. So "solution" is only this directory's while these
+    modules are imported, and is then put back to whatever it was, leaving
+    test_solution.py to find the candidate's.
+    """
+    global answer_solution
+
+    candidate = sys.modules.pop("solution", None)
+    if answer_solution is not None:
+        sys.modules["solution"] = answer_solution
+    sys.path.insert(0, ANSWER_DIRECTORY)
+    try:
+        modules = [importlib.import_module(name) for name in names]
+        answer_solution = importlib.import_module("solution")
+        return modules
+    finally:
+        sys.path.remove(ANSWER_DIRECTORY)
+        sys.modules.pop("solution", None)
+        if candidate is not None:
+            sys.modules["solution"] = candidate
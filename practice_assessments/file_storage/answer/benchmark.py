@@ -0,0 +1,424 @@
+"""
+Micro-benchmarks for the FileHost reference answer.
+
+Run from this directory:
+  python3 benchmark.py            # every benchmark
+  python3 benchmark.py search     # only the named benchmark(s)
+"""
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+from datetime import datetime, timedelta
+
+from loadgen import run_load
+from persistent import PersistentFileHost
+from sharded import ShardedFileHost
+from traces import DEFAULT_MIX, generate_trace
+from solution import FileHost, TIMESTAMP_FORMAT, parse_timestamp, process_operations, solution
+
+
+def _timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def _replay_trace(length, names=10_000, ops_per_second=10):
+    # a monotonic mix of timestamped uploads, gets and copies, with the clock
+    # ticking once every ops_per_second operations
+    start = datetime(2022, 1, 1)
+    operations = []
+    for i in range(length):
+        ts = (start + timedelta(seconds=i // ops_per_second)).strftime(TIMESTAMP_FORMAT)
+        name = f"file{i * 7919 % names}.txt"
+        if i % 4 == 0:
+            operations.append(["FILE_UPLOAD_AT", ts, name, "100kb", "3600"])
+        elif i % 4 == 1:
+            operations.append(["FILE_COPY_AT", ts, name, f"copy{i % names}.txt"])
+        else:
+            operations.append(["FILE_GET_AT", ts, name])
+    return operations
+
+
+def _test_traces():
+    # the operation lists that ../test_solution.py feeds to solution()
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+    import test_solution
+
+    traces = []
+
+    def record(operations):
+        results = solution(operations)
+        traces.append(operations)
+        return results
+
+    test_solution.solution = record
+    suite = unittest.defaultTestLoader.loadTestsFromModule(test_solution)
+    unittest.TextTestRunner(stream=io.StringIO()).run(suite)
+    return traces
+
+
+def bench_search(sizes=(1_000, 10_000, 100_000, 1_000_000), repeat=1_000):
+    # the number of matches stays at 10 while the rest of the namespace grows,
+    # so per-search latency should stay flat; the cache is disabled so every
+    # search does the full lookup
+    print("FILE_SEARCH latency vs. total file count (10 matching files)")
+    for total in sizes:
+        host = FileHost(search_cache_size=0)
+        for i in range(total - 10):
+            host.upload(0, f"file{i:07d}.txt", "100kb")
+        for i in range(10):
+            host.upload(0, f"needle{i}.txt", f"{i}kb")
+
+        latency = _timeit(lambda: host.search(0, "needle"), repeat)
+        print(f"  {total:>9} files: {latency * 1e6:8.2f} us/search")
+
+
+def bench_broad_search(total=100_000, repeat=20):
+    # every file matches the prefix, so the cost is dominated by ranking;
+    # the cache is disabled so every search ranks them again
+    print(f"FILE_SEARCH latency with all {total} files matching")
+    host = FileHost(search_cache_size=0)
+    for i in range(total):
+        host.upload(0, f"log{i:07d}.txt", f"{i % 1000}kb")
+
+    for prefix in ("", "log"):
+        latency = _timeit(lambda: host.search(0, prefix), repeat)
+        print(f"  prefix {prefix!r:>6}: {latency * 1e3:8.2f} ms/search")
+
+
+def bench_repeated_search(total=100_000, repeat=10_000):
+    # the same broad prefix searched over and over with no writes in between
+    print(f"repeated FILE_SEARCH latency over {total} matching files")
+    host = FileHost()
+    for i in range(total):
+        host.upload(0, f"log{i:07d}.txt", f"{i % 1000}kb")
+
+    first = _timeit(lambda: host.search(0, "log"), 1)
+    repeated = _timeit(lambda: host.search(0, "log"), repeat)
+    print(f"  first search: {first * 1e3:8.2f} ms")
+    print(f"  repeated:     {repeated * 1e6:8.2f} us/search")
+
+
+def bench_version_chain(sizes=(10, 1_000, 100_000), repeat=10_000):
+    # "hot" is re-copied many times; in the worst case every copy but the
+    # original upload has expired, so a lookup must skip the whole chain
+    print("FILE_GET latency vs. versions stored under one name")
+    for versions in sizes:
+        live, expired = FileHost(), FileHost()
+        for host, ttl in ((live, None), (expired, 1)):
+            host.upload(0, "hot", "100kb")
+            host.upload(0, "src", "100kb", ttl)
+            for _ in range(versions - 1):
+                host.copy(0, "src", "hot")
+
+        # the first lookup at t=10 also runs the expiry sweep; leave it out
+        expired.get(10, "hot")
+        latest = _timeit(lambda: live.get(0, "hot"), repeat)
+        oldest = _timeit(lambda: expired.get(10, "hot"), repeat)
+        print(f"  {versions:>7} versions: latest live {latest * 1e6:6.2f} us, "
+              f"only oldest live {oldest * 1e6:6.2f} us")
+
+
+def bench_expired_search(sizes=(1_000, 10_000, 100_000), repeat=1_000):
+    # all but ten files have expired by the time of the search; the cache is
+    # disabled so every search does the full lookup
+    print("FILE_SEARCH latency vs. expired file count (10 live files)")
+    for total in sizes:
+        host = FileHost(search_cache_size=0)
+        for i in range(total - 10):
+            host.upload(0, f"tmp{i:07d}.txt", "100kb", "60")
+        for i in range(10):
+            host.upload(0, f"tmp{i}.log", f"{i}kb")
+
+        sweep = _timeit(lambda: host.search(3600, "tmp"), 1)
+        latency = _timeit(lambda: host.search(3600, "tmp"), repeat)
+        print(f"  {total:>7} files: {latency * 1e6:8.2f} us/search "
+              f"(one-off expiry sweep {sweep * 1e3:.2f} ms)")
+
+
+def bench_short_rollback(sizes=(1_000, 10_000, 100_000), repeat=1_000):
+    # a large store that keeps writing a couple of files and rolling them back
+    print("ROLLBACK latency vs. store size (2 writes undone per rollback)")
+    for total in sizes:
+        host = FileHost()
+        for i in range(total):
+            host.upload(0, f"file{i:07d}.txt", "100kb", "3600" if i % 2 else None)
+
+        def write_and_rollback():
+            host.upload(1, "scratch.txt", "1kb")
+            host.copy(1, "scratch.txt", "scratch.bak")
+            host.rollback(0, "1970-01-01T00:00:00")
+
+        latency = _timeit(write_and_rollback, repeat)
+        print(f"  {total:>7} files: {latency * 1e6:8.2f} us/rollback")
+
+
+def bench_memory(names=10_000, copies=9):
+    # every name gets one upload plus a number of re-copies, half with a TTL
+    total = names * (1 + copies)
+    print(f"memory per stored version ({total} versions over {names} names)")
+
+    tracemalloc.start()
+    host = FileHost()
+    for i in range(names):
+        host.upload(0, f"file{i:07d}.txt", f"{i % 1000}kb", "86400" if i % 2 else None)
+    for t in range(1, copies + 1):
+        for i in range(names):
+            host.copy(t, f"file{i:07d}.txt", f"file{(i + t) % names:07d}.txt")
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"  {used / total:8.1f} bytes/version")
+
+
+def bench_fan_out(copies=100_000):
+    # one upload copied to many names: each copy costs one more version
+    print(f"memory per copy when one file is copied to {copies} names")
+    host = FileHost()
+    host.upload(0, "source.bin", "1gb", "86400")
+
+    tracemalloc.start()
+    for i in range(copies):
+        host.copy(1, "source.bin", f"copy{i:07d}.bin")
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"  {used / copies:8.1f} bytes/copy")
+
+
+def bench_replay(length=1_000_000):
+    print(f"solution() throughput on a {length}-operation trace")
+    operations = _replay_trace(length)
+    timestamps = [operation[1] for operation in operations]
+
+    strptime = _timeit(lambda: [datetime.strptime(ts, TIMESTAMP_FORMAT).timestamp() for ts in timestamps], 1)
+    parse_timestamp.cache_clear()
+    memo = _timeit(lambda: [parse_timestamp(ts) for ts in timestamps], 1)
+    replay = _timeit(lambda: solution(operations), 1)
+
+    print(f"  timestamps via strptime:        {length / strptime:12,.0f} ops/s")
+    print(f"  timestamps via parse_timestamp: {length / memo:12,.0f} ops/s")
+    print(f"  solution():                     {length / replay:12,.0f} ops/s")
+
+
+def bench_test_traces(repeat=5_000):
+    traces = _test_traces()
+    length = sum(len(operations) for operations in traces)
+    print(f"solution() throughput on the {len(traces)} test_solution.py traces")
+
+    latency = _timeit(lambda: [solution(operations) for operations in traces], repeat)
+    print(f"  {length / latency:12,.0f} ops/s")
+
+
+def bench_read_batches(names=10_000, rounds=5_000):
+    # each second one file is uploaded and then its directory is read: gets
+    # plus searches over nested prefixes of the new name, all of which the
+    # upload has just evicted from the search cache
+    print(f"read-heavy replay over {names} files ({rounds} write + 20 read rounds)")
+    start = datetime(2022, 1, 1)
+    operations = [
+        ["FILE_UPLOAD_AT", start.strftime(TIMESTAMP_FORMAT), f"dir{i % 10}/file{i}.txt", f"{i % 1000}kb"]
+        for i in range(names)
+    ]
+    for r in range(rounds):
+        ts = (start + timedelta(seconds=1 + r)).strftime(TIMESTAMP_FORMAT)
+        directory = f"dir{r % 10}/"
+        operations.append(["FILE_UPLOAD_AT", ts, f"{directory}file{names + r}.txt", "1kb"])
+        for i in range(10):
+            operations.append(["FILE_SEARCH_AT", ts, directory + "file1"[:i % 6] + str(i)[:i // 6]])
+            operations.append(["FILE_GET_AT", ts, f"{directory}file{(r * 10 + i) % names}.txt"])
+
+    for batch in (1, 1024):
+        latency = _timeit(lambda: list(process_operations(operations, read_batch_size=batch)), 1)
+        print(f"  read_batch_size={batch:<5} {len(operations) / latency:12,.0f} ops/s")
+
+
+def bench_deep_rollback(total=200_000, distances=(100, 10_000, 100_000, 199_000),
+                        intervals=(None, 50_000, 10_000, 1_000, 100)):
+    # one write per second, a third of them with a TTL; then a single
+    # rollback by the given number of seconds, on a fresh store each time
+    def build(interval):
+        host = FileHost(checkpoint_every=interval)
+        for t in range(total):
+            host.upload(t, f"file{t:06d}.txt", "100kb", "600" if t % 3 == 0 else None)
+        return host
+
+    print(f"ROLLBACK latency vs. distance ({total} writes, checkpoint every N writes)")
+    print("  " + " " * 14 + "".join(f"{f'N={n}':>14}" for n in intervals))
+
+    # every checkpoint copies the store, so frequent ones slow down writes
+    build_times = [f"{_timeit(lambda: build(interval), 1):12.2f} s" for interval in intervals]
+    print("  build time:   " + "".join(f"{cell:>14}" for cell in build_times))
+
+    memory = []
+    for interval in intervals:
+        tracemalloc.start()
+        host = build(interval)
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory.append(f"{used / 2 ** 20:10.1f} MiB")
+        del host
+    print("  memory held:  " + "".join(f"{cell:>14}" for cell in memory))
+
+    for distance in distances:
+        row = []
+        for interval in intervals:
+            host = build(interval)
+            latency = _timeit(lambda: host.rollback(total - distance, ""), 1)
+            row.append(f"{latency * 1e3:11.2f} ms")
+        print(f"  {distance:>7}s back: " + "".join(f"{cell:>14}" for cell in row))
+
+
+def bench_cold_start(length=1_000_000):
+    # rebuilding a FileHost from its on-disk log vs. replaying the trace
+    print(f"cold start after a {length}-operation trace")
+    operations = _replay_trace(length)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "store.log")
+        with PersistentFileHost(path) as host:
+            logged = _timeit(lambda: list(process_operations(operations, host)), 1)
+
+        replay = _timeit(lambda: solution(operations), 1)
+        reopen = _timeit(lambda: PersistentFileHost(path).close(), 1)
+
+        print(f"  solution() with logging: {logged:6.2f} s")
+        print(f"  replay via solution():   {replay:6.2f} s")
+        print(f"  reopen the log:          {reopen:6.2f} s ({os.path.getsize(path) / 2 ** 20:.1f} MiB)")
+
+
+def bench_sharded(length=1_000_000, shards=(1, 2, 4, os.cpu_count())):
+    # the replay trace is all single-name operations and copies; with one
+    # shard per core, throughput should scale until the routing process
+    # itself is the bottleneck. Its own CPU time is the floor on the wall
+    # time, so solution()'s time over it is the most sharding can speed up
+    print(f"sharded throughput on a {length}-operation trace ({os.cpu_count()} CPUs)")
+    operations = _replay_trace(length)
+
+    start = time.process_time()
+    latency = _timeit(lambda: solution(operations), 1)
+    baseline = time.process_time() - start
+    print(f"  solution():         {length / latency:12,.0f} ops/s")
+    for count in sorted(set(shards)):
+        with ShardedFileHost(count) as host:
+            start = time.process_time()
+            latency = _timeit(lambda: list(host.run(operations)), 1)
+            routing = time.process_time() - start
+        print(f"  {count:>3} shard(s):       {length / latency:12,.0f} ops/s, "
+              f"routing CPU {routing:5.2f} s (at most {baseline / routing:.1f}x solution())")
+
+
+def bench_server(length=50_000, loads=((1, 1), (8, 1), (8, 32))):
+    # server.py in its own process on a Unix socket, driven by loadgen.py
+    print(f"server latency on a {length}-operation trace (connections x depth)")
+    operations = generate_trace(length)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "server.sock")
+        for connections, depth in loads:
+            server = subprocess.Popen([sys.executable, "server.py", "--unix", path],
+                                      cwd=os.path.dirname(os.path.abspath(__file__)))
+            while not os.path.exists(path):
+                time.sleep(0.01)
+            try:
+                report = asyncio.run(run_load(operations, connections, depth, path=path))
+            finally:
+                server.terminate()
+                server.wait()
+                os.unlink(path)
+
+            # refused operations are answered at once, so the throughput and
+            # latencies only count those that were served
+            print(f"  {connections:>2} x {depth:<3} {report['ops_per_second']:10,.0f} ops/s, "
+                  f"p50 {report['p50_ms']:7.3f} ms, p99 {report['p99_ms']:7.3f} ms, "
+                  f"{report['served']} served, {report['errors']} refused")
+
+
+# generate_trace() options for bench_trace
+TRACE_PRESETS = {
+    "default": {},
+    "read-heavy": {"mix": {"FILE_UPLOAD_AT": 5, "FILE_GET_AT": 70, "FILE_COPY_AT": 5, "FILE_SEARCH_AT": 20}},
+    "write-heavy": {"mix": {"FILE_UPLOAD_AT": 60, "FILE_GET_AT": 10, "FILE_COPY_AT": 28, "FILE_SEARCH_AT": 2}},
+    "rollback-heavy": {"mix": {**DEFAULT_MIX, "ROLLBACK": 10}, "rollback_depth": 60},
+    "flat-prefixes": {"prefix_skew": 0},
+    "many-names": {"names": 1_000_000, "directories": 1_000},
+}
+
+
+def _latencies(operations):
+    # seconds each operation takes when run on its own, by operation
+    latencies = {}
+    clock = time.perf_counter
+    start = clock()
+    for operation, _ in zip(operations, process_operations(operations, read_batch_size=1)):
+        now = clock()
+        latencies.setdefault(operation[0], []).append(now - start)
+        start = now
+    return latencies
+
+
+def _histogram(latencies):
+    # share of latencies per power-of-two bucket of microseconds, leaving
+    # out buckets under 1%
+    buckets = {}
+    for latency in latencies:
+        bucket = 1
+        while bucket < latency * 1e6:
+            bucket *= 2
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+    return " ".join(f"<{bucket}us:{count / len(latencies):4.0%}" for bucket, count in sorted(buckets.items())
+                    if count / len(latencies) >= 0.01)
+
+
+def bench_trace(length=200_000, seed=0, presets=TRACE_PRESETS):
+    # solution() on generated traces: throughput, latency per operation and
+    # peak traced memory
+    for preset, options in presets.items():
+        operations = generate_trace(length, seed, **options)
+        print(f"{preset} trace: {length} operations, seed {seed}")
+
+        throughput = length / _timeit(lambda: solution(operations), 1)
+        tracemalloc.start()
+        solution(operations)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {throughput:12,.0f} ops/s, peak memory {peak / 2 ** 20:.1f} MiB")
+
+        for operation, latencies in sorted(_latencies(operations).items()):
+            latencies.sort()
+            print(f"  {operation:<15} n={len(latencies):<7} p50 {latencies[len(latencies) // 2] * 1e6:7.1f} us"
+                  f"  p99 {latencies[len(latencies) * 99 // 100] * 1e6:7.1f} us  max {latencies[-1] * 1e6:9.1f} us")
+            print(f"    {_histogram(latencies)}")
+
+
+BENCHMARKS = {
+    "search": bench_search,
+    "broad_search": bench_broad_search,
+    "repeated_search": bench_repeated_search,
+    "version_chain": bench_version_chain,
+    "expired_search": bench_expired_search,
+    "short_rollback": bench_short_rollback,
+    "memory": bench_memory,
+    "fan_out": bench_fan_out,
+    "replay": bench_replay,
+    "test_traces": bench_test_traces,
+    "read_batches": bench_read_batches,
+    "deep_rollback": bench_deep_rollback,
+    "cold_start": bench_cold_start,
+    "sharded": bench_sharded,
+    "server": bench_server,
+    "trace": bench_trace,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -0,0 +1,326 @@
+"""
+Randomized differential testing of file hosting engines.
+
+An engine is anything that maps a list of operations to their results, like
+solution(). check() runs one on seeded traces from traces.py next to
+reference_solution(), the original answer with nothing shared with
+solution.py, and on the first trace where they disagree shrinks it to a
+minimal reproducer.
+
+Run from this directory:
+  python3 differential.py                    # every engine in ENGINES
+  python3 differential.py sharded --seeds 50 # only the named engine(s)
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from fractions import Fraction
+
+from instrumentation import instrumented_solution
+from persistent import PersistentFileHost
+from sharded import sharded_solution
+from solution import FileHost, OPERATIONS, process_operations, solution
+from traces import DEFAULT_MIX, generate_trace
+
+
+# the spec's size units; the oracle parses sizes itself, so that it can
+# catch a regression in solution.parse_size
+REFERENCE_UNITS = {"": 1, "b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3, "tb": 1024 ** 4}
+
+
+def reference_size(size):
+    # "100kb" -> 102400; a bare number is a count of bytes, and units may be
+    # in either case
+    number = size.rstrip(string.ascii_letters)
+
+    return round(Fraction(number) * REFERENCE_UNITS[size[len(number):].lower()])
+
+
+# What follows is the original answer, from before any of the indexes went
+# in, with search ranking by size in bytes as the level statements now
+# require. Every version ever written is kept in a list per name, and every
+# lookup scans it: slow, but simple enough to serve as the oracle for the
+# engines that are not.
+
+class ReferenceFile():
+    def __init__(self, size, timestamp=None, ttl=None):
+        self.size = size
+        self.timestamp = timestamp
+        self.ttl = ttl
+
+
+REFERENCE_TS_OPS = ["FILE_UPLOAD_AT", "FILE_GET_AT", "FILE_COPY_AT", "FILE_SEARCH_AT", "ROLLBACK"]
+
+
+class ReferenceFileHost():
+    def __init__(self):
+        self.filesystem = defaultdict(list)
+
+    def _get_at(self, name, timestamp):
+        files = self.filesystem.get(name)
+
+        if not files:
+            return None
+
+        for file in reversed(files):
+            if file.ttl:
+                if file.timestamp + file.ttl < timestamp:
+                    continue
+
+            return file
+
+        return None
+
+    def upload(self, timestamp, name, size, ttl=None):
+        if ttl:
+            ttl = int(ttl)
+
+        if self._get_at(name, timestamp):
+            return "error: file already exists"
+
+        self.filesystem[name].append(ReferenceFile(size, timestamp, ttl))
+
+        return f"uploaded {name}"
+
+    def get(self, timestamp, name):
+        if self._get_at(name, timestamp):
+            return f"got {name}"
+        else:
+            return "file not found"
+
+    def copy(self, timestamp, source, dest):
+        source_contents = self._get_at(source, timestamp)
+
+        if not source_contents:
+            return "error: source file not found"
+
+        new_ttl = None
+        if source_contents.ttl:
+            expiration_ts = source_contents.timestamp + source_contents.ttl
+            new_ttl = expiration_ts - timestamp
+
+        new_file = ReferenceFile(source_contents.size, timestamp, new_ttl)
+
+        self.filesystem[dest].append(new_file)
+
+        return f"copied {source} to {dest}"
+
+    def search(self, timestamp, prefix):
+        matches = [name for name in self.filesystem.keys() if name.startswith(prefix) and self._get_at(name, timestamp)]
+
+        matches.sort(key = lambda name: (reference_size(self._get_at(name, timestamp).size), name), reverse=True)
+
+        return f"found [{', '.join(matches[:10])}]"
+
+    def rollback(self, timestamp, ts_str):
+        new_fs = defaultdict(list)
+        for name, files in self.filesystem.items():
+            for file in files:
+                if file.timestamp <= timestamp:
+                    new_fs[name].append(file)
+
+        self.filesystem = new_fs
+
+        return f"rollback to {ts_str}"
+
+
+def reference_solution(operations):
+    file_host = ReferenceFileHost()
+    results = []
+    last_ts = 0
+
+    for operation in operations:
+        operation_type = operation[0]
+        args = operation[1:]
+
+        if operation_type in REFERENCE_TS_OPS:
+            last_ts = datetime.strptime(args[0], "%Y-%m-%dT%H:%M:%S").timestamp()
+            args = args[1:]
+
+        match operation_type:
+            case "FILE_UPLOAD" | "FILE_UPLOAD_AT":
+                result = file_host.upload(last_ts, *args)
+            case "FILE_GET" | "FILE_GET_AT":
+                result = file_host.get(last_ts, *args)
+            case "FILE_COPY" | "FILE_COPY_AT":
+                result = file_host.copy(last_ts, *args)
+            case "FILE_SEARCH" | "FILE_SEARCH_AT":
+                result = file_host.search(last_ts, *args)
+            case "ROLLBACK":
+                ts_str = operation[1]
+                result = file_host.rollback(last_ts, ts_str)
+            case _:
+                raise ValueError(f"Unknown operation: {operation_type}")
+
+        results.append(result)
+
+    return results
+
+
+def _persistent(operations):
+    # through a fresh log, closing and reopening it halfway; the reopened
+    # host starts over from timestamp 0, so the second half has to start on
+    # a timestamped operation
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "store.log")
+        half = next((i for i in range(len(operations) // 2, len(operations)) if OPERATIONS[operations[i][0]][1]),
+                    len(operations))
+        with PersistentFileHost(path) as host:
+            results = list(process_operations(operations[:half], host))
+        with PersistentFileHost(path) as host:
+            results += process_operations(operations[half:], host)
+    return results
+
+
+# name -> engine
+ENGINES = {
+    "solution": solution,
+    "unbatched": lambda operations: list(process_operations(operations, read_batch_size=1)),
+    "checkpoints": lambda operations: list(process_operations(operations, FileHost(checkpoint_every=8))),
+    "instrumented": lambda operations: instrumented_solution(operations)[0],
+    "persistent": _persistent,
+    "sharded": lambda operations: sharded_solution(operations, 3),
+}
+
+
+def random_trace(seed, length):
+    # a small world, so that names collide, files expire and rollbacks undo
+    rng = random.Random(seed)
+    trace = generate_trace(
+        length, seed,
+        mix={**DEFAULT_MIX, "ROLLBACK": rng.choice([0, 1, 5])},
+        names=rng.choice([4, 20, 100]),
+        directories=rng.choice([1, 3, 10]),
+        prefix_skew=rng.choice([0, 1, 2]),
+        ttls={None: 2, 1: 1, 5: 1, 60: 1},
+        rollback_depth=rng.choice([1, 10, 100]),
+        ops_per_second=rng.choice([1, 3, 10]),
+    )
+
+    # traces.py writes every size as a lowercase number and unit, and every
+    # operation but ROLLBACK as its *_AT form; some sizes are respelled in
+    # bytes or uppercase, and some operations dropped to their level 1 form,
+    # which runs at the timestamp of the operation before
+    level1 = rng.choice([0, 0.1, 0.5])
+    for i, operation in enumerate(trace):
+        if operation[0] == "FILE_UPLOAD_AT":
+            spelling = rng.randrange(3)
+            if spelling == 1:
+                operation[3] = str(reference_size(operation[3]))
+            elif spelling == 2:
+                operation[3] = operation[3].upper()
+        if operation[0] != "ROLLBACK" and rng.random() < level1:
+            trace[i] = [operation[0].removesuffix("_AT"), *operation[2:]]
+
+    return trace
+
+
+def _results(engine, operations):
+    # an exception stands in for the results from the operation that raised
+    try:
+        return engine(operations)
+    except Exception as error:
+        return [f"raised {type(error).__name__}: {error}"]
+
+
+def first_divergence(engine, operations, reference=reference_solution):
+    """
+    The index of the first operation engine and reference disagree on, or
+    None if they agree on the whole trace.
+    """
+    expected, actual = _results(reference, operations), _results(engine, operations)
+    if expected == actual:
+        return None
+
+    return next((i for i, (want, got) in enumerate(zip(expected, actual)) if want != got),
+                min(len(expected), len(actual)))
+
+
+def shrink(operations, fails):
+    """
+    Delta debugging: removes ever smaller runs of operations from a trace as
+    long as fails() still holds for what is left, and returns the result.
+    """
+    chunks = 2
+    while len(operations) > 1:
+        size = -(-len(operations) // chunks)
+        for start in range(0, len(operations), size):
+            candidate = operations[:start] + operations[start + size:]
+            if fails(candidate):
+                operations = candidate
+                chunks = max(chunks - 1, 2)
+                break
+        else:
+            if size == 1:
+                break
+            chunks = min(chunks * 2, len(operations))
+
+    return operations
+
+
+def check(engine, seeds=range(200), length=200, reference=reference_solution):
+    """
+    Runs engine and reference on random_trace(seed, length) for each seed.
+
+    Returns:
+      Optional[Dict]: None if they always agree. Otherwise the seed of the
+      first trace they disagree on, that trace shrunk to a minimal
+      "operations" list that still disagrees, the "index" of its first
+      diverging operation, and the "expected" and "actual" results there.
+    """
+    for seed in seeds:
+        operations = random_trace(seed, length)
+        index = first_divergence(engine, operations, reference)
+        if index is None:
+            continue
+
+        # nothing after the divergence can matter
+        operations = shrink(operations[:index + 1],
+                            lambda candidate: first_divergence(engine, candidate, reference) is not None)
+        index = first_divergence(engine, operations, reference)
+
+        expected, actual = _results(reference, operations), _results(engine, operations)
+        return {
+            "seed": seed,
+            "operations": operations,
+            "index": index,
+            "expected": expected[index] if index < len(expected) else None,
+            "actual": actual[index] if index < len(actual) else None,
+        }
+
+    return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("engines", nargs="*", metavar="engine", help=f"any of {', '.join(ENGINES)}")
+    parser.add_argument("--seeds", type=int, default=200)
+    parser.add_argument("--length", type=int, default=200)
+    options = parser.parse_args()
+    for name in options.engines:
+        if name not in ENGINES:
+            parser.error(f"unknown engine: {name}")
+
+    failed = False
+    for name in options.engines or ENGINES:
+        divergence = check(ENGINES[name], range(options.seeds), options.length)
+        if divergence is None:
+            print(f"{name}: agrees on {options.seeds} traces")
+            continue
+
+        failed = True
+        operations, index = divergence["operations"], divergence["index"]
+        print(f"{name}: diverges on seed {divergence['seed']}, "
+              f"shrunk to {len(operations)} operations; first at operation {index}")
+        for i, operation in enumerate(operations):
+            print(f"  {'>' if i == index else ' '} {json.dumps(operation)}")
+        print(f"  expected: {divergence['expected']!r}")
+        print(f"  actual:   {divergence['actual']!r}")
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,179 @@
+"""
+Opt-in counters and timings for FileHost.
+
+InstrumentedFileHost records, into a Stats:
+  - calls, total and max latency of upload, get, copy, search and rollback,
+    and of the timestamp parses process_operations() does for it;
+  - how many versions each walk down a version chain steps over to find
+    the live one: the re-resolution of a name after a write or an expiry,
+    and every read of a time before the host's clock. Reads at the clock
+    are answered from the live index without a walk, and are not counted;
+  - how many live files match each search that is not answered from the
+    search cache.
+
+A plain FileHost pays nothing for any of this. An instrumented host runs
+reads one at a time rather than through FileHost.read_batch, so that each
+one is measured.
+
+Run from this directory:
+  python3 instrumentation.py trace.jsonl               # stats as JSON
+  python3 instrumentation.py trace.jsonl --prometheus  # Prometheus text
+"""
+import argparse
+import json
+import sys
+import time
+from functools import wraps
+
+from solution import FileHost, live_version, parse_timestamp, process_operations, read_operations
+
+
+class Stats():
+    def __init__(self):
+        # operation -> [calls, total seconds, max seconds]
+        self.latencies = {}
+        # quantity -> [observations, total, max]
+        self.counts = {}
+
+    def record_latency(self, operation, seconds):
+        latency = self.latencies.get(operation)
+        if latency is None:
+            self.latencies[operation] = [1, seconds, seconds]
+            return
+
+        latency[0] += 1
+        latency[1] += seconds
+        if seconds > latency[2]:
+            latency[2] = seconds
+
+    def record_count(self, quantity, value):
+        count = self.counts.get(quantity)
+        if count is None:
+            self.counts[quantity] = [1, value, value]
+            return
+
+        count[0] += 1
+        count[1] += value
+        if value > count[2]:
+            count[2] = value
+
+    def timed(self, operation, function):
+        # function, recording the latency of every call under operation
+        clock = time.perf_counter
+        record = self.record_latency
+
+        def timed_function(*args):
+            start = clock()
+            try:
+                return function(*args)
+            finally:
+                record(operation, clock() - start)
+
+        return timed_function
+
+    def as_dict(self):
+        return {
+            "operations": {
+                operation: {"calls": calls, "seconds_total": total, "seconds_max": most}
+                for operation, (calls, total, most) in self.latencies.items()
+            },
+            **{
+                quantity: {"observations": observations, "total": total, "max": most}
+                for quantity, (observations, total, most) in self.counts.items()
+            },
+        }
+
+    def prometheus(self, namespace="file_storage"):
+        """
+        The stats in the Prometheus text exposition format, e.g.
+        file_storage_operation_calls_total{operation="get"} 12.
+        """
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {namespace}_{name} {help_text}")
+            lines.append(f"# TYPE {namespace}_{name} {kind}")
+            lines.extend(f"{namespace}_{name}{labels} {value}" for labels, value in samples)
+
+        operations = sorted(self.latencies.items())
+        metric("operation_calls_total", "counter", "Operations run.",
+               [(f'{{operation="{operation}"}}', calls) for operation, (calls, _, _) in operations])
+        metric("operation_seconds_total", "counter", "Time spent in operations.",
+               [(f'{{operation="{operation}"}}', total) for operation, (_, total, _) in operations])
+        metric("operation_seconds_max", "gauge", "Slowest single operation.",
+               [(f'{{operation="{operation}"}}', most) for operation, (_, _, most) in operations])
+
+        for quantity, (observations, total, most) in sorted(self.counts.items()):
+            metric(quantity, "summary", f"{quantity.replace('_', ' ').capitalize()} per call.",
+                   [("_count", observations), ("_sum", total)])
+            metric(f"{quantity}_max", "gauge", f"Most {quantity.replace('_', ' ')} in one call.", [("", most)])
+
+        return "\n".join(lines) + "\n"
+
+
+def _timed(method):
+    # a FileHost method that records its latency under its own name
+    operation = method.__name__
+
+    @wraps(method)
+    def timed_method(self, *args):
+        start = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            self.stats.record_latency(operation, time.perf_counter() - start)
+
+    return timed_method
+
+
+class InstrumentedFileHost(FileHost):
+    def __init__(self, stats=None, **host_options):
+        super().__init__(**host_options)
+        self.stats = stats or Stats()
+
+    upload = _timed(FileHost.upload)
+    get = _timed(FileHost.get)
+    copy = _timed(FileHost.copy)
+    search = _timed(FileHost.search)
+    rollback = _timed(FileHost.rollback)
+
+    def _live_version(self, name, timestamp):
+        return live_version(self.filesystem.get(name), timestamp, self._record_versions_scanned)
+
+    def _record_versions_scanned(self, steps):
+        self.stats.record_count("versions_scanned", steps)
+
+    def _timestamp_parser(self):
+        return self.stats.timed("parse_timestamp", parse_timestamp)
+
+    def _rank(self, prefix, matches):
+        self.stats.record_count("search_matches", len(matches))
+
+        return super()._rank(prefix, matches)
+
+
+def instrumented_solution(operations, stats=None):
+    """
+    solution() on an InstrumentedFileHost.
+
+    Returns:
+      Tuple[List[str], Stats]: The output messages and the stats recorded.
+    """
+    host = InstrumentedFileHost(stats)
+
+    return list(process_operations(operations, host)), host.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("trace", nargs="?", help="NDJSON trace; stdin by default")
+    parser.add_argument("--prometheus", action="store_true", help="print Prometheus text instead of JSON")
+    options = parser.parse_args()
+
+    with open(options.trace) if options.trace else sys.stdin as trace:
+        _, stats = instrumented_solution(read_operations(trace))
+
+    if options.prometheus:
+        print(stats.prometheus(), end="")
+    else:
+        print(json.dumps(stats.as_dict(), indent=2))
@@ -0,0 +1,123 @@
+"""
+A load generator for server.py.
+
+Opens a number of connections, splits a trace between them, and keeps up to
+--depth operations in flight on each. Reports how many operations the
+server answered with an error, and for the rest the throughput and the
+p50/p99 latency from sending an operation to reading its result. With more
+than one connection the errors include operations refused for arriving
+after a later timestamp had already run; they are answered at once, so
+they are left out of the throughput and latencies.
+
+Run from this directory, with the server already listening:
+  python3 loadgen.py --port 8765 --connections 8 --depth 32
+  python3 loadgen.py --unix /tmp/file_storage.sock --trace trace.jsonl
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from math import nan
+
+from solution import read_operations
+from traces import generate_trace
+
+
+async def run_connection(connect, operations, depth):
+    # latencies in seconds of the operations sent on one connection that
+    # got a result back, and how many got an error instead
+    reader, writer = await connect()
+    in_flight = asyncio.Semaphore(depth)
+    sent = deque()
+    latencies = []
+    errors = 0
+
+    async def receive():
+        nonlocal errors
+        for _ in operations:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("server closed the connection")
+            latency = time.perf_counter() - sent.popleft()
+            if line.startswith(b'{"error"'):
+                errors += 1
+            else:
+                latencies.append(latency)
+            in_flight.release()
+
+    receiver = asyncio.create_task(receive())
+    for operation in operations:
+        await in_flight.acquire()
+        sent.append(time.perf_counter())
+        writer.write(json.dumps(operation).encode() + b"\n")
+        await writer.drain()
+
+    await receiver
+    writer.close()
+
+    return latencies, errors
+
+
+async def run_load(operations, connections=8, depth=32, host="127.0.0.1", port=8765, path=None):
+    """
+    Replays operations against a running server over the given number of
+    connections, each taking every connections-th operation so its own
+    operations stay in timestamp order.
+
+    Returns:
+      Dict[str, float]: ops_per_second, p50_ms and p99_ms over the
+      operations that got a result, the number of them that did (served),
+      and the number that got an error instead (errors). The latencies are
+      NaN if none were served.
+    """
+    if path:
+        connect = lambda: asyncio.open_unix_connection(path)
+    else:
+        connect = lambda: asyncio.open_connection(host, port)
+
+    start = time.perf_counter()
+    per_connection = await asyncio.gather(*(
+        run_connection(connect, operations[i::connections], depth) for i in range(connections)
+    ))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for connection, _ in per_connection for latency in connection)
+    served = len(latencies)
+    if not latencies:
+        latencies = [nan]
+
+    return {
+        "ops_per_second": served / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1e3,
+        "p99_ms": latencies[min(len(latencies) * 99 // 100, len(latencies) - 1)] * 1e3,
+        "served": served,
+        "errors": sum(errors for _, errors in per_connection),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--depth", type=int, default=32, help="operations in flight per connection")
+    parser.add_argument("--operations", type=int, default=100_000, help="length of the synthetic trace")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic trace")
+    parser.add_argument("--trace", help="replay this NDJSON trace instead of a synthetic one")
+    options = parser.parse_args()
+
+    if options.trace:
+        with open(options.trace) as trace:
+            operations = list(read_operations(trace))
+    else:
+        operations = generate_trace(options.operations, options.seed)
+
+    report = asyncio.run(run_load(operations, options.connections, options.depth,
+                                  options.host, options.port, options.unix))
+    print(f"{len(operations)} operations over {options.connections} connections, depth {options.depth}")
+    print(f"  {report['served']} served, {report['errors']} errors (not counted below)")
+    print(f"  {report['ops_per_second']:12,.0f} ops/s")
+    print(f"  p50 {report['p50_ms']:8.3f} ms")
+    print(f"  p99 {report['p99_ms']:8.3f} ms")
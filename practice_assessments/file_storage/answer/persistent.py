@@ -0,0 +1,253 @@
+"""
+A FileHost whose history survives restarts.
+
+Every write goes to an append-only binary log next to the in-memory state.
+Opening the same log again maps it into memory and rebuilds the FileHost
+straight from its records, which is much cheaper than replaying the
+operation history through solution(): there are no operations to parse and
+no results to format. Records undone by rollbacks are dropped from the log
+in the background once they make up most of it.
+
+Run from this directory:
+  python3 persistent.py store.log trace.jsonl > results.txt
+"""
+import mmap
+import os
+import struct
+import sys
+import threading
+from math import inf
+
+from solution import File, FileHost, process_operations, read_operations
+
+
+LOG_HEADER = b"FSLOG\x00\x01\x00"
+
+# kind, name id (or the byte length of a name), size in bytes, timestamp, ttl
+# (0 for none); a NAME record is followed by the name in UTF-8 and gives it
+# the next id
+RECORD = struct.Struct("<B3xIQdd")
+NAME, VERSION, CLOCK, ROLLBACK = range(1, 5)
+
+# compact once the log holds this many times more records than the journal,
+# and at least COMPACT_MIN_RECORDS more
+COMPACT_RATIO = 2
+COMPACT_MIN_RECORDS = 4096
+
+
+class PersistentFileHost(FileHost):
+    # process_operations() dispatches straight to FileHost's own methods, so
+    # the hooks here are the underscored ones those call.
+    # The log records the writes and rollbacks made through this host, plus
+    # the clock whenever a read moved it without a write to show for it.
+    # Replaying those through FileHost rebuilds the same journal, so
+    # rollbacks keep working across restarts.
+    def __init__(self, path, compact_ratio=COMPACT_RATIO, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.compact_ratio = compact_ratio
+        # name -> id, in id order
+        self.name_ids = {}
+        # VERSION, CLOCK and ROLLBACK records in the log
+        self.log_records = 0
+        # the clock that replaying the log so far would leave
+        self.logged_clock = -inf
+        # held while appending to the log and while a compaction swaps it
+        self.lock = threading.Lock()
+        self.compactor = None
+
+        self._load()
+        self.log = open(path, "ab")
+
+    def _load(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, "wb") as log:
+                log.write(LOG_HEADER)
+            return
+
+        with open(self.path, "rb") as log, mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(LOG_HEADER)] != LOG_HEADER:
+                raise ValueError(f"Not a file storage log: {self.path}")
+            end = self._replay(mapped)
+
+        # a crash can leave half a record at the end; appends go after the
+        # last whole one
+        if end < os.path.getsize(self.path):
+            os.truncate(self.path, end)
+
+    def _replay(self, mapped):
+        # apply the records through the plain FileHost methods so nothing is
+        # logged again; returns the offset after the last whole record
+        names = []
+        unpack_from = RECORD.unpack_from
+        offset = len(LOG_HEADER)
+        end = len(mapped)
+
+        while offset + RECORD.size <= end:
+            kind, name_id, size, timestamp, ttl = unpack_from(mapped, offset)
+            start, offset = offset, offset + RECORD.size
+
+            if kind == VERSION:
+                FileHost._advance(self, timestamp)
+                FileHost._add_version(self, names[name_id], size, timestamp, ttl or None)
+            elif kind == CLOCK:
+                FileHost._advance(self, timestamp)
+            elif kind == ROLLBACK:
+                FileHost._rollback(self, timestamp)
+            elif kind == NAME:
+                if offset + name_id > end:
+                    return start
+                names.append(str(mapped[offset:offset + name_id], "utf-8"))
+                self.name_ids[names[-1]] = len(names) - 1
+                offset += name_id
+                continue
+            else:
+                raise ValueError(f"Corrupt file storage log: {self.path} at byte {start}")
+
+            self.log_records += 1
+
+        self.logged_clock = self.clock
+
+        return offset
+
+    def _append(self, kind, name_id=0, size=0, timestamp=0, ttl=0):
+        # callers hold self.lock
+        # the record is packed before anything is written, so one that is out
+        # of range leaves the log as it was
+        try:
+            record = RECORD.pack(kind, name_id, size, timestamp, ttl)
+        except struct.error:
+            raise ValueError(f"Too large for the file storage log: size {size}, ttl {ttl}") from None
+
+        # replaying a write advances the clock to its timestamp; say so first
+        # if the clock is past that
+        if kind == VERSION and self.clock != max(self.logged_clock, timestamp):
+            self._append(CLOCK, timestamp=self.clock)
+
+        self.log.write(record)
+        self.log_records += 1
+        self.logged_clock = self.clock
+
+    def _name_id(self, name):
+        # callers hold self.lock
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.name_ids)
+            encoded = name.encode("utf-8")
+            self.log.write(RECORD.pack(NAME, len(encoded), 0, 0, 0))
+            self.log.write(encoded)
+
+        return name_id
+
+    # writes and rollbacks hold the lock throughout, so a compaction sees
+    # the journal and the log at the same point
+
+    def _add_version(self, name, size, timestamp, ttl):
+        with self.lock:
+            # logged first, so that a write the log cannot hold does not
+            # reach the in-memory state either
+            self._append(VERSION, self._name_id(name), size, timestamp, ttl or 0)
+            super()._add_version(name, size, timestamp, ttl)
+
+    def _rollback(self, timestamp):
+        with self.lock:
+            self._flush_clock()
+            super()._rollback(timestamp)
+            self._append(ROLLBACK, timestamp=timestamp)
+
+        if (self.log_records > self.compact_ratio * len(self.journal) + COMPACT_MIN_RECORDS
+                and not (self.compactor and self.compactor.is_alive())):
+            self.compactor = threading.Thread(target=self.compact, daemon=True)
+            self.compactor.start()
+
+    def compact(self):
+        """
+        Rewrites the log as just the history the journal still holds, so
+        records undone by rollbacks stop costing disk space and start-up time.
+        Safe to run on another thread while this host keeps serving
+        operations: records appended meanwhile are carried over at the end.
+        """
+        with self.lock:
+            self._flush_clock()
+            self.log.flush()
+            start = self.log.tell()
+            journal, journal_times = self.journal[:], self.journal_times[:]
+            names = list(self.name_ids)
+            clock = self.clock
+
+        compacted = self.path + ".compact"
+        records = 0
+        with open(compacted, "wb") as log:
+            log.write(LOG_HEADER)
+            for name in names:
+                encoded = name.encode("utf-8")
+                log.write(RECORD.pack(NAME, len(encoded), 0, 0, 0))
+                log.write(encoded)
+
+            # journal entries that are not writes are sweeps, which replaying
+            # a CLOCK record at their time pops again
+            logged = -inf
+            for entry, time in zip(journal, journal_times):
+                if type(entry) is File:
+                    log.write(RECORD.pack(VERSION, self.name_ids[entry.name], entry.size,
+                                          entry.timestamp, entry.ttl or 0))
+                elif time > logged:
+                    log.write(RECORD.pack(CLOCK, 0, 0, time, 0))
+                else:
+                    continue
+                logged = max(logged, time)
+                records += 1
+
+            if clock > logged:
+                log.write(RECORD.pack(CLOCK, 0, 0, clock, 0))
+                records += 1
+
+            with self.lock:
+                self.log.flush()
+                with open(self.path, "rb") as tail:
+                    tail.seek(start)
+                    appended = tail.read()
+                log.write(appended)
+                log.flush()
+                os.fsync(log.fileno())
+
+                os.replace(compacted, self.path)
+                self.log.close()
+                self.log = open(self.path, "ab")
+                # close enough: a few of the appended bytes may be names
+                self.log_records = records + len(appended) // RECORD.size
+
+    def _flush_clock(self):
+        # callers hold self.lock
+        if self.clock != self.logged_clock:
+            self._append(CLOCK, timestamp=self.clock)
+
+    def flush(self):
+        # hand everything written so far to the operating system
+        with self.lock:
+            self._flush_clock()
+            self.log.flush()
+
+    def close(self):
+        if self.compactor:
+            self.compactor.join()
+
+        self.flush()
+        self.log.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    # python3 persistent.py store.log trace.jsonl (reads stdin without a trace)
+    # stdin may be typed or piped in a line at a time, so its reads are not
+    # held back for a batch that might not fill until EOF
+    with PersistentFileHost(sys.argv[1]) as host, \
+            open(sys.argv[2]) if len(sys.argv) > 2 else sys.stdin as trace:
+        for result in process_operations(read_operations(trace), host,
+                                         read_batch_size=1024 if len(sys.argv) > 2 else 1):
+            print(result, flush=trace is sys.stdin)
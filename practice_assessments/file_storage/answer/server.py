@@ -0,0 +1,239 @@
+"""
+An asyncio front-end serving one FileHost to many clients.
+
+Clients send operations in the same newline-delimited JSON as
+read_operations(), e.g. ["FILE_GET_AT", "2022-01-01T00:00:00", "a.txt"], and
+get back one JSON line per operation, in the order they were sent: the
+result string, or {"error": "..."} for an operation that failed. A client
+may have many operations in flight on one connection without waiting for
+their results.
+
+All connections feed one engine. Whatever has arrived since its last turn
+is run together: mutations in timestamp order, and runs of reads at one
+timestamp as a single FileHost.read_batch. FileHost needs timestamps not
+to decrease between rollbacks, so a request stamped earlier than one the
+engine has already run, which arrived too late to be sorted before it,
+is answered with an error rather than run.
+
+Run from this directory:
+  python3 server.py --port 8765
+  python3 server.py --unix /tmp/file_storage.sock
+"""
+import argparse
+import asyncio
+import inspect
+import json
+from datetime import datetime
+
+from solution import FileHost, OPERATIONS, READS, TIMESTAMP_FORMAT, parse_timestamp
+
+
+def _arity(method):
+    # (fewest, most) arguments a FileHost method takes after the timestamp
+    parameters = list(inspect.signature(method).parameters.values())[2:]
+    return sum(parameter.default is parameter.empty for parameter in parameters), len(parameters)
+
+
+# FileHost method -> _arity(method), so that a malformed request is refused
+# on its own instead of failing the batch it would have been run in
+ARITIES = {handler: _arity(handler) for handler, _, _ in OPERATIONS.values()}
+
+
+def parse_request(line):
+    # one request line, as bytes -> (handler, timestamp or None, args);
+    # ValueError if it is not a known operation with the right arguments
+    try:
+        operation = json.loads(line)
+    except ValueError:
+        operation = None
+
+    if type(operation) is not list or not operation or not all(type(arg) is str for arg in operation):
+        raise ValueError(f"Not an operation: {line.decode(errors='replace').strip()}")
+
+    try:
+        handler, timestamped, first_arg = OPERATIONS[operation[0]]
+    except KeyError:
+        raise ValueError(f"Unknown operation: {operation[0]}") from None
+
+    if timestamped and len(operation) < 2:
+        raise ValueError(f"Not an operation: {line.decode(errors='replace').strip()}")
+
+    fewest, most = ARITIES[handler]
+    if not fewest <= len(operation) - first_arg <= most:
+        raise ValueError(f"Wrong number of arguments: {line.decode(errors='replace').strip()}")
+
+    timestamp = parse_timestamp(operation[1]) if timestamped else None
+
+    return handler, timestamp, operation[first_arg:]
+
+
+def _format_timestamp(timestamp):
+    # the inverse of parse_timestamp()
+    return datetime.fromtimestamp(timestamp).strftime(TIMESTAMP_FORMAT)
+
+
+class FileHostServer():
+    def __init__(self, file_host=None, max_in_flight=1024):
+        self.file_host = file_host or FileHost()
+        # most requests a connection may have waiting on the engine before
+        # the server stops reading from it
+        self.max_in_flight = max_in_flight
+        # the timestamp operations without one run at, as in
+        # process_operations(); also the latest timestamp run since the last
+        # rollback, below which requests are refused
+        self.last_ts = 0
+        # (handler, timestamp, args, future) received since the engine's
+        # last turn, in arrival order
+        self.requests = []
+        self.wake = asyncio.Event()
+
+    def submit(self, line):
+        # a future for the result of the request on line
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.requests.append((*parse_request(line), future))
+            self.wake.set()
+        except ValueError as error:
+            future.set_exception(error)
+
+        return future
+
+    async def run_engine(self):
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            requests, self.requests = self.requests, []
+            self._run(self._order(requests))
+            # let the connections queue up the next turn's requests
+            await asyncio.sleep(0)
+
+    def _order(self, requests):
+        # requests from different connections may arrive out of timestamp
+        # order; a stable sort by timestamp fixes that without reordering
+        # any one connection's. A request without a timestamp sorts with the
+        # one before it. ROLLBACK's timestamp is its target, not when it
+        # happens, so it stays where it arrived and splits the sort.
+        ordered = []
+        segment = []
+        key = self.last_ts
+        for request in requests:
+            if request[0] is FileHost.rollback:
+                segment.sort(key=lambda keyed: keyed[0])
+                ordered += [request for _, request in segment]
+                ordered.append(request)
+                segment = []
+                key = request[1]
+                continue
+
+            if request[1] is not None:
+                key = request[1]
+            segment.append((key, request))
+
+        segment.sort(key=lambda keyed: keyed[0])
+        ordered += [request for _, request in segment]
+
+        return ordered
+
+    def _run(self, requests):
+        reads = []
+        for handler, timestamp, args, future in requests:
+            if timestamp is None:
+                timestamp = self.last_ts
+            elif timestamp < self.last_ts and handler is not FileHost.rollback:
+                future.set_exception(ValueError(f"Timestamp {_format_timestamp(timestamp)} is before "
+                                                f"{_format_timestamp(self.last_ts)}, which has already run"))
+                continue
+            self.last_ts = timestamp
+
+            if handler in READS:
+                if reads and reads[0][1] != timestamp:
+                    self._run_reads(reads)
+                    reads = []
+                reads.append((handler, timestamp, args, future))
+                continue
+
+            if reads:
+                self._run_reads(reads)
+                reads = []
+
+            try:
+                future.set_result(handler(self.file_host, timestamp, *args))
+            except Exception as error:
+                future.set_exception(error)
+
+        if reads:
+            self._run_reads(reads)
+
+    def _run_reads(self, reads):
+        try:
+            results = self.file_host.read_batch(reads[0][1], [(handler, args) for handler, _, args, _ in reads])
+        except Exception:
+            # running a read twice does no harm, so run them again one at a
+            # time for each to get its own result or error
+            for handler, timestamp, args, future in reads:
+                try:
+                    future.set_result(handler(self.file_host, timestamp, *args))
+                except Exception as error:
+                    future.set_exception(error)
+        else:
+            for read, result in zip(reads, results):
+                read[3].set_result(result)
+
+    async def handle(self, reader, writer):
+        # results are written in request order as soon as each is ready;
+        # the queue bounds how far reading gets ahead of them
+        results = asyncio.Queue(self.max_in_flight)
+
+        async def respond():
+            while (future := await results.get()) is not None:
+                try:
+                    response = json.dumps(await future)
+                except ValueError as error:
+                    response = json.dumps({"error": str(error)})
+                except Exception as error:
+                    response = json.dumps({"error": f"{type(error).__name__}: {error}"})
+
+                writer.write(response.encode() + b"\n")
+                if results.empty():
+                    await writer.drain()
+
+        responder = asyncio.create_task(respond())
+        try:
+            async for line in reader:
+                if line.strip():
+                    await results.put(self.submit(line))
+        except ConnectionError:
+            pass
+        finally:
+            # the responder only stops early if the client went away
+            if not responder.done():
+                await results.put(None)
+            try:
+                await responder
+            except ConnectionError:
+                pass
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, path=None):
+        # a Unix socket at path if given, otherwise TCP on host and port
+        engine = asyncio.create_task(self.run_engine())
+        if path:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            engine.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    options = parser.parse_args()
+
+    asyncio.run(FileHostServer().serve(options.host, options.port, options.unix))
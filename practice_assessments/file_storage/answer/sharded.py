@@ -0,0 +1,303 @@
+"""
+A FileHost spread over a pool of processes, one shard each.
+
+Names are hash-partitioned across the shards, so FILE_UPLOAD, FILE_GET and
+a FILE_COPY within one shard run on that shard alone. The rest are split:
+
+  - FILE_SEARCH runs on every shard, and the top 10 of their top 10s wins.
+  - ROLLBACK runs on every shard.
+  - FILE_COPY across shards reads the source on its shard, which passes
+    it straight to the destination's shard to write.
+
+Operations are handed to the shards in batches, and every shard runs its
+part of a batch without waiting on the routing process. The results are
+exactly those of solution(). If a shard raises, the error is re-raised from
+run() and the host cannot be used again: the other shards have already run
+the rest of their batch.
+
+The routing process only looks up each operation's name to pick its shard:
+operations are passed on as they came, and the shards parse their
+timestamps and arguments and format their results. It still has to pickle
+every operation and unpickle every result, and its CPU time bounds the
+speedup over solution() however many cores there are. bench_sharded reports
+it. On its 1M-operation replay trace, solution() takes 1.16 s of CPU, and
+the routing process takes 0.48 s with 1 shard and 0.70 s with 4. So the
+ceiling is about 2.4x, falling to 1.6x at 4 shards. Those figures come
+from a single-CPU machine, where the shards and the router share one core.
+Wall-clock scaling on more cores has not been measured.
+
+Run from this directory:
+  python3 sharded.py trace.jsonl > results.txt
+"""
+import multiprocessing
+import os
+import sys
+from heapq import nlargest
+
+from solution import FileHost, OPERATIONS, parse_timestamp, read_operations
+
+
+def _timestamp(ts_str):
+    # level 1 operations before the first timestamped one run at 0
+    return 0 if ts_str is None else parse_timestamp(ts_str)
+
+
+def _run(host, ts_str, *args):
+    # a level 1 upload, get or copy within this shard, with the timestamp of
+    # the operation before it filled in: args is the operation itself
+    handler, _, first_arg = OPERATIONS[args[0]]
+    return handler(host, _timestamp(ts_str), *args[first_arg:])
+
+
+def _top(host, ts_str, prefix):
+    # this shard's (size, name) candidates for a search
+    host._advance(_timestamp(ts_str))
+    live = host.live
+    i, j = host._prefix_range(prefix)
+
+    return nlargest(10, [(live[name].size, name) for name in host.names[i:j]])
+
+
+def _source(host, ts_str, name, dest, inbox, copy_id):
+    # the read half of a copy whose destination is on another shard: sends
+    # that shard the size and TTL the copy gets, as in FileHost.copy, or
+    # None if there is no source, and returns the copy's result
+    timestamp = _timestamp(ts_str)
+    file = host._get_at(name, timestamp)
+    copied = file and (file.size, file.timestamp + file.ttl - timestamp if file.ttl else None)
+    host.outboxes[inbox].append((copy_id, copied))
+
+    return f"copied {name} to {dest}" if file else "error: source file not found"
+
+
+def _put(host, ts_str, name, copy_id):
+    # the write half: waits for the source's shard to get to the read half
+    arrived = host.arrived
+    if copy_id not in arrived:
+        # the source's shard may in turn be waiting on this one
+        host.send_copies()
+        while copy_id not in arrived:
+            arrived.update(host.inboxes[host.shard].get())
+
+    copied = arrived.pop(copy_id)
+    timestamp = _timestamp(ts_str)
+    host._advance(timestamp)
+    if copied:
+        size, ttl = copied
+        host._add_version(name, size, timestamp, ttl)
+
+
+def _rollback(host, ts_str):
+    host._rollback(_timestamp(ts_str))
+
+
+# what a shard can be asked to run besides a timestamped upload, get or copy
+# within it, which it is sent as the operation list itself
+SHARD_OPERATIONS = (_run, _top, _source, _put, _rollback)
+RUN, TOP, SOURCE, PUT, ROLLBACK = range(len(SHARD_OPERATIONS))
+
+# opcode -> (how the router handles it, index in the operation of its first
+# argument after the timestamp, whether operation[1] is a timestamp)
+ROUTES = {
+    opcode: (handler.__name__, first_arg, timestamped)
+    for opcode, (handler, timestamped, first_arg) in OPERATIONS.items()
+}
+
+
+class Shard(FileHost):
+    # a FileHost holding one shard's names, plus what it needs to pass copies
+    # to and from the other shards
+    def __init__(self, shard, inboxes, **host_options):
+        super().__init__(**host_options)
+        self.shard = shard
+        # one queue per shard of lists of (copy id, source) for the copies it
+        # writes; outboxes collects this shard's until they are sent
+        self.inboxes = inboxes
+        self.outboxes = [[] for _ in inboxes]
+        # copy id -> source for copies whose write half has not run yet
+        self.arrived = {}
+
+    def send_copies(self):
+        for shard, outbox in enumerate(self.outboxes):
+            if outbox:
+                self.inboxes[shard].put(outbox)
+                self.outboxes[shard] = []
+
+
+def _serve(connection, shard, inboxes, host_options):
+    # a shard's process: runs each batch it receives and sends back the
+    # results, until it receives None. A batch holds operation lists and
+    # (SHARD_OPERATIONS index, timestamp string, *args) tuples; PUT and
+    # ROLLBACK have no result of their own, and are left out of the results
+    host = Shard(shard, inboxes, **host_options)
+
+    while True:
+        batch = connection.recv()
+        if batch is None:
+            break
+
+        results = []
+        last_ts_str = None
+        last_ts = 0
+        try:
+            for done, item in enumerate(batch):
+                if type(item) is list:
+                    handler, _, first_arg = OPERATIONS[item[0]]
+                    if item[1] != last_ts_str:
+                        last_ts_str = item[1]
+                        last_ts = parse_timestamp(last_ts_str)
+                    results.append(handler(host, last_ts, *item[first_arg:]))
+                else:
+                    result = SHARD_OPERATIONS[item[0]](host, *item[1:])
+                    if result is not None:
+                        results.append(result)
+        except Exception as error:
+            # the shards waiting on this one's copies must not hang
+            for item in batch[done:]:
+                if type(item) is tuple and item[0] == SOURCE:
+                    host.outboxes[item[4]].append((item[5], None))
+            results = error
+
+        host.send_copies()
+        connection.send(results)
+
+
+class ShardedFileHost():
+    def __init__(self, shards=None, batch_size=4096, **host_options):
+        # host_options are passed to every shard's FileHost
+        self.shards = shards or os.cpu_count()
+        self.batch_size = batch_size
+        self.connections = []
+        self.workers = []
+        self.copies = 0
+        # the error a shard raised, after which the shards are out of step
+        self.failed = None
+
+        inboxes = [multiprocessing.Queue() for _ in range(self.shards)]
+        for shard in range(self.shards):
+            connection, shard_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=_serve, args=(shard_connection, shard, inboxes, host_options),
+                                             daemon=True)
+            worker.start()
+            shard_connection.close()
+            self.connections.append(connection)
+            self.workers.append(worker)
+
+    def run(self, operations):
+        """
+        Streams a file hosting session through the shards, like
+        process_operations(): results are yielded in order, a batch at a
+        time.
+        """
+        if self.failed:
+            raise RuntimeError("ShardedFileHost is unusable after an earlier error") from self.failed
+
+        shards = self.shards
+        last_ts_str = None
+        # per shard, what it is to run next
+        pending = [[] for _ in range(shards)]
+        # per operation, where its result comes from: the shard that runs it
+        # or the source's shard for a copy, or for a search or rollback a
+        # tuple starting with its SHARD_OPERATIONS index
+        order = []
+
+        for operation in operations:
+            try:
+                route, first_arg, timestamped = ROUTES[operation[0]]
+            except KeyError:
+                raise ValueError(f"Unknown operation: {operation[0]}") from None
+
+            if timestamped:
+                last_ts_str = operation[1]
+
+            if route == "search":
+                for shard in range(shards):
+                    pending[shard].append((TOP, last_ts_str, *operation[first_arg:]))
+                order.append((TOP,))
+            elif route == "rollback":
+                for shard in range(shards):
+                    pending[shard].append((ROLLBACK, last_ts_str))
+                order.append((ROLLBACK, operation[1]))
+            else:
+                shard = hash(operation[first_arg]) % shards
+                if route == "copy" and hash(operation[first_arg + 1]) % shards != shard:
+                    source, dest = operation[first_arg:]
+                    dest_shard = hash(dest) % shards
+                    self.copies += 1
+                    pending[shard].append((SOURCE, last_ts_str, source, dest, dest_shard, self.copies))
+                    pending[dest_shard].append((PUT, last_ts_str, dest, self.copies))
+                else:
+                    pending[shard].append(operation if timestamped else (RUN, last_ts_str, *operation))
+                order.append(shard)
+
+            if len(order) >= self.batch_size:
+                yield from self._drain(pending, order)
+                order = []
+
+        yield from self._drain(pending, order)
+
+    def _run_pending(self, pending):
+        # every shard is sent its batch before any is waited on, so they run
+        # in parallel; returns each shard's results
+        shards = [shard for shard in range(self.shards) if pending[shard]]
+        for shard in shards:
+            self.connections[shard].send(pending[shard])
+            pending[shard] = []
+
+        # every reply is read even once one is an error, so none is left in
+        # its pipe for the next batch to mistake for its own
+        replies = [()] * self.shards
+        errors = []
+        for shard in shards:
+            replies[shard] = self.connections[shard].recv()
+            if isinstance(replies[shard], Exception):
+                errors.append(replies[shard])
+
+        if errors:
+            self.failed = errors[0]
+            raise errors[0]
+
+        return replies
+
+    def _drain(self, pending, order):
+        replies = [iter(reply) for reply in self._run_pending(pending)]
+
+        for route in order:
+            if type(route) is int:
+                yield next(replies[route])
+            elif route[0] == TOP:
+                # names are unique across shards, so this is the same order
+                # as ranking every match at once
+                candidates = [candidate for reply in replies for candidate in next(reply)]
+                yield f"found [{', '.join(name for _, name in nlargest(10, candidates))}]"
+            else:
+                yield f"rollback to {route[1]}"
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+            connection.close()
+        for worker in self.workers:
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def sharded_solution(operations, shards=None):
+    """
+    solution() run on a ShardedFileHost with the given number of shards, one
+    per CPU by default.
+    """
+    with ShardedFileHost(shards) as host:
+        return list(host.run(operations))
+
+
+if __name__ == "__main__":
+    # python3 sharded.py trace.jsonl > results.txt (reads stdin without a path)
+    with ShardedFileHost() as host, open(sys.argv[1]) if len(sys.argv) > 1 else sys.stdin as trace:
+        for result in host.run(read_operations(trace)):
+            print(result)
@@ -1,33 +1,299 @@
+import json
+import re
+import sys
+from bisect import bisect_left, bisect_right, insort
 from datetime import datetime
-from collections import defaultdict
+from decimal import Decimal
+from functools import lru_cache
+from collections import OrderedDict
+from heapq import heappop, heappush, nlargest
+from math import inf
+
+
+SIZE_UNITS = {"": 1, "b": 1, "kb": 1024, "mb": 1024 ** 2, "gb": 1024 ** 3, "tb": 1024 ** 4}
+SIZE_PATTERN = re.compile(r"\s*(\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*")
+
+
+def parse_size(size):
+    # "100kb" -> 102400; a bare number is a count of bytes
+    match = SIZE_PATTERN.fullmatch(size)
+    unit = match and SIZE_UNITS.get(match.group(2).lower())
+
+    if not unit:
+        raise ValueError(f"Invalid file size: {size}")
+
+    return round(Decimal(match.group(1)) * unit)
 
 
 class File():
-    def __init__(self, size, timestamp=None, ttl=None):
+    # One version of a file. The versions written to a name form an immutable
+    # chain through parent, so undoing a write or restoring a checkpoint only
+    # has to point the name back at an older head.
+    __slots__ = ("size", "timestamp", "expiry", "name", "parent", "below", "jump", "depth")
+
+    # size is in bytes
+    def __init__(self, size, timestamp=None, ttl=None, name=None, parent=None):
         self.size = size
         self.timestamp = timestamp
-        self.ttl = ttl
+        self.expiry = timestamp + ttl if ttl else inf
+        self.name = name
+        self.parent = parent
+
+        # below is the newest older version that expires strictly later than
+        # this one: only versions on that chain can be the newest live version
+        # once this one expires. Expiries strictly increase along it, and jump
+        # is a skew-binary jump pointer over it, so searches take O(log n).
+        below = parent
+        while below is not None and below.expiry <= self.expiry:
+            jump = below.jump
+            below = jump if jump is not None and jump.expiry <= self.expiry else below.below
+
+        self.below = below
+        self.depth = below.depth + 1 if below else 1
+
+        jump = below.jump if below else None
+        if jump is not None and below.depth - jump.depth == jump.depth - (jump.jump.depth if jump.jump else 0):
+            self.jump = jump.jump
+        else:
+            self.jump = below
+
+    @property
+    def ttl(self):
+        return None if self.expiry == inf else self.expiry - self.timestamp
+
+
+def live_version(file, timestamp, record_steps=None):
+    # the newest version in the chain headed by file that is alive at
+    # timestamp; record_steps, if given, is called with how many versions
+    # were stepped over to find it
+    steps = 0
+    while file is not None and file.expiry < timestamp:
+        jump = file.jump
+        file = jump if jump is not None and jump.expiry < timestamp else file.below
+        steps += 1
+
+    if record_steps is not None:
+        record_steps(steps)
+
+    return file
+
+
+class Checkpoint():
+    # The state of a FileHost at clock, taken before any write at clock. File
+    # chains are immutable, so the copied containers share every version, but
+    # the containers themselves are copied in full: a checkpoint costs time
+    # and memory in proportion to the number of names stored.
+    __slots__ = ("clock", "journal_length", "filesystem", "live", "names", "expirations")
+
+    def __init__(self, host):
+        self.clock = host.clock
+        self.journal_length = len(host.journal)
+        self.filesystem = dict(host.filesystem)
+        self.live = dict(host.live)
+        self.names = list(host.names)
+        self.expirations = list(host.expirations)
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+@lru_cache(maxsize=4096)
+def parse_timestamp(ts_str):
+    # fromisoformat is much faster than strptime, but also accepts other ISO
+    # 8601 shapes, so it is only used once the string has the exact layout
+    if (len(ts_str) == 19 and ts_str[4] == ts_str[7] == "-" and ts_str[10] == "T"
+            and ts_str[13] == ts_str[16] == ":"):
+        moment = datetime.fromisoformat(ts_str)
+    else:
+        moment = datetime.strptime(ts_str, TIMESTAMP_FORMAT)
+
+    return moment.timestamp()
+
+
+CHECKPOINT_RESTORE_RATIO = 16
 
-TS_OPS = ["FILE_UPLOAD_AT", "FILE_GET_AT", "FILE_COPY_AT", "FILE_SEARCH_AT", "ROLLBACK"]
 
 class FileHost():
-    def __init__(self):
-        self.filesystem = defaultdict(list)
+    # timestamps are expected not to decrease between rollbacks, as in the spec
+    def __init__(self, search_cache_size=1024, checkpoint_every=None, checkpoint_seconds=None, max_checkpoints=8):
+        # name -> newest version written to it; older versions hang off parent
+        self.filesystem = {}
+        # the operation time that self.live reflects
+        self.clock = -inf
+        # name -> version visible at self.clock
+        self.live = {}
+        # every name in self.live, kept sorted so a prefix is a contiguous run
+        self.names = []
+        # (expiry, name) for every version with a TTL that has not expired yet
+        self.expirations = []
+        # every change to the live state, oldest first: the File written, or
+        # (name, expiry) for a heap entry popped by a sweep; journal_times
+        # holds the time of each entry
+        self.journal = []
+        self.journal_times = []
+        # prefix -> result, least recently used first
+        self.search_cache = OrderedDict()
+        self.search_cache_size = search_cache_size
+        # a checkpoint is taken when the clock advances once either this many
+        # journal entries or this many seconds have passed since the last one;
+        # deep rollbacks restore the nearest one instead of undoing everything.
+        # However small these are, checkpoints are at least one per
+        # len(filesystem) // CHECKPOINT_RESTORE_RATIO journal entries apart,
+        # which keeps the copying to O(1) per write
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_seconds = checkpoint_seconds
+        # each checkpoint copies the containers above, so only this many are
+        # kept; see _thin_checkpoints
+        if max_checkpoints < 2:
+            raise ValueError("max_checkpoints must be at least 2")
+        self.max_checkpoints = max_checkpoints
+        self.checkpoints = [Checkpoint(self)] if checkpoint_every or checkpoint_seconds else []
+
+    def _advance(self, timestamp):
+        if timestamp > self.clock:
+            self.clock = timestamp
+            self._sweep()
+
+            if self.checkpoints:
+                last = self.checkpoints[-1]
+                # a checkpoint takes about as long to copy as to restore, which
+                # is worth undoing that many journal entries; one taken sooner
+                # after the last would cost more than it could save
+                entries = len(self.journal) - last.journal_length
+                if entries >= len(self.filesystem) // CHECKPOINT_RESTORE_RATIO and (
+                        (self.checkpoint_every and entries >= self.checkpoint_every)
+                        or (self.checkpoint_seconds and timestamp - last.clock >= self.checkpoint_seconds)):
+                    self.checkpoints.append(Checkpoint(self))
+                    if len(self.checkpoints) > self.max_checkpoints:
+                        self._thin_checkpoints()
+
+    def _thin_checkpoints(self):
+        # drop the checkpoint whose neighbours are closest together in the
+        # journal; the first (empty) and the newest are always kept, and the
+        # rest stay roughly evenly spread, which bounds how much a rollback
+        # has to redo after restoring one
+        checkpoints = self.checkpoints
+        i = min(range(1, len(checkpoints) - 1),
+                key=lambda i: checkpoints[i + 1].journal_length - checkpoints[i - 1].journal_length)
+        del checkpoints[i]
+
+    def _sweep(self):
+        expired = set()
+        while self.expirations and self.expirations[0][0] < self.clock:
+            expiry, name = heappop(self.expirations)
+            self.journal.append((name, expiry))
+            self.journal_times.append(self.clock)
+            expired.add(name)
+
+        self._unindex([name for name in expired if self._refresh(name)])
+
+    def _refresh(self, name):
+        # re-resolve which version of name is visible at the clock; returns
+        # True if name just stopped being visible, in which case the caller
+        # must drop it from self.names
+        file = self._live_version(name, self.clock)
+
+        if file is self.live.get(name):
+            return False
+
+        self._invalidate_search(name)
+
+        if file is None:
+            del self.live[name]
+            return True
+
+        if name not in self.live:
+            insort(self.names, name)
+        self.live[name] = file
+
+        return False
+
+    def _unindex(self, names):
+        # drop names, all of which are in self.names; deleting in place moves
+        # the tail after each name, so rebuild with slice copies instead once
+        # that adds up to more than the whole list, or just filter the list
+        # when a large share of it goes
+        if len(names) * 8 > len(self.names):
+            names = set(names)
+            self.names = [name for name in self.names if name not in names]
+            return
+
+        indices = sorted(bisect_left(self.names, name) for name in names)
+        if sum(len(self.names) - i for i in indices) < len(self.names):
+            for i in reversed(indices):
+                del self.names[i]
+            return
+
+        kept = []
+        start = 0
+        for i in indices:
+            kept += self.names[start:i]
+            start = i + 1
+        kept += self.names[start:]
+
+        self.names = kept
+
+    def _add_version(self, name, size, timestamp, ttl):
+        parent = self.filesystem.get(name)
+        if parent is not None:
+            # share one copy of the name string between every index
+            name = parent.name
+
+        file = self.filesystem[name] = File(size, timestamp, ttl, name, parent)
+        self.journal.append(file)
+        self.journal_times.append(timestamp)
+
+        if file.expiry != inf:
+            heappush(self.expirations, (file.expiry, name))
+
+        if self._refresh(name):
+            self._unindex([name])
+
+    def _invalidate_search(self, name):
+        if not self.search_cache:
+            return
+
+        # the only cached searches that can see this name are its own prefixes
+        for i in range(len(name) + 1):
+            self.search_cache.pop(name[:i], None)
+
+    def _prefix_range(self, prefix, lo=0, hi=None):
+        # the names starting with prefix are self.names[i:j]
+        names = self.names
+        if hi is None:
+            hi = len(names)
+
+        i = bisect_left(names, prefix, lo, hi)
+
+        if not prefix:
+            return i, hi
+
+        if prefix[-1] == "\U0010ffff":
+            j = i
+            while j < hi and names[j].startswith(prefix):
+                j += 1
+            return i, j
+
+        # every name under prefix sorts before prefix with its last character bumped
+        return i, bisect_left(names, prefix[:-1] + chr(ord(prefix[-1]) + 1), i, hi)
 
     def _get_at(self, name, timestamp):
-        files = self.filesystem.get(name)
+        self._advance(timestamp)
 
-        if not files:
-            return None
+        if timestamp == self.clock:
+            return self.live.get(name)
 
-        for file in reversed(files):
-            if file.ttl:
-                if file.timestamp + file.ttl < timestamp:
-                    continue
-            
-            return file
-        
-        return None
+        return self._live_version(name, timestamp)
+
+    def _live_version(self, name, timestamp):
+        # every walk down a version chain goes through here, so that
+        # instrumentation can count its steps
+        return live_version(self.filesystem.get(name), timestamp)
+
+    def _timestamp_parser(self):
+        # what process_operations() parses timestamps with; instrumentation
+        # swaps in a timed one
+        return parse_timestamp
 
     def upload(self, timestamp, name, size, ttl=None):
         if ttl:
@@ -36,7 +302,7 @@ class FileHost():
         if self._get_at(name, timestamp):
             return "error: file already exists"
         
-        self.filesystem[name].append(File(size, timestamp, ttl))
+        self._add_version(name, parse_size(size), timestamp, ttl)
 
         return f"uploaded {name}"
     
@@ -57,30 +323,262 @@ class FileHost():
             expiration_ts = source_contents.timestamp + source_contents.ttl
             new_ttl = expiration_ts - timestamp
 
-        new_file = File(source_contents.size, timestamp, new_ttl)
-
-        self.filesystem[dest].append(new_file)
+        self._add_version(dest, source_contents.size, timestamp, new_ttl)
 
         return f"copied {source} to {dest}"
 
     def search(self, timestamp, prefix):
-        matches = [name for name in self.filesystem.keys() if name.startswith(prefix) and self._get_at(name, timestamp)]
-        
-        matches.sort(key = lambda name: (self._get_at(name, timestamp).size, name), reverse=True)
+        self._advance(timestamp)
+
+        result = self.search_cache.get(prefix)
+        if result:
+            self.search_cache.move_to_end(prefix)
+            return result
+
+        live = self.live
+        i, j = self._prefix_range(prefix)
 
-        return f"found [{', '.join(matches[:10])}]"
+        return self._rank(prefix, [(live[name].size, name) for name in self.names[i:j]])
+
+    def _rank(self, prefix, matches):
+        # matches holds (size, name) for every live name under prefix; names
+        # are unique, so this is the same order as a full descending sort
+        top = nlargest(10, matches)
+        result = f"found [{', '.join(name for _, name in top)}]"
+
+        self.search_cache[prefix] = result
+        self.search_cache.move_to_end(prefix)
+        if len(self.search_cache) > self.search_cache_size:
+            self.search_cache.popitem(last=False)
+
+        return result
     
+    def read_batch(self, timestamp, reads):
+        """
+        Runs a run of reads that share a timestamp, with no writes between
+        them, and returns their results in order. reads holds (method, args)
+        pairs where method is FileHost.get or FileHost.search.
+
+        The clock is advanced once for the whole run. Searches are evaluated
+        in prefix order, and a prefix nested under one already scanned in the
+        batch ranks a slice of that scan instead of rebuilding it.
+        """
+        self._advance(timestamp)
+
+        if timestamp != self.clock:
+            return [method(self, timestamp, *args) for method, args in reads]
+
+        live = self.live
+        names = self.names
+
+        searches = {}
+        root = None
+        for prefix in sorted({args[0] for method, args in reads if method is FileHost.search and len(args) == 1}):
+            result = self.search_cache.get(prefix)
+            if result:
+                self.search_cache.move_to_end(prefix)
+                searches[prefix] = result
+                continue
+
+            if root is None or not prefix.startswith(root):
+                root = prefix
+                lo, hi = self._prefix_range(root)
+                matches = [(live[name].size, name) for name in names[lo:hi]]
+
+            i, j = self._prefix_range(prefix, lo, hi)
+            searches[prefix] = self._rank(prefix, matches[i - lo:j - lo])
+
+        results = []
+        for method, args in reads:
+            if method is FileHost.search and len(args) == 1:
+                results.append(searches[args[0]])
+            elif method is FileHost.get and len(args) == 1:
+                results.append(f"got {args[0]}" if args[0] in live else "file not found")
+            else:
+                results.append(method(self, timestamp, *args))
+
+        return results
+
+    def _undo(self, keep):
+        # undo the journal back to its first keep entries, newest first
+        changed = set()
+        for entry in reversed(self.journal[keep:]):
+            if type(entry) is File:
+                if entry.parent is None:
+                    del self.filesystem[entry.name]
+                else:
+                    self.filesystem[entry.name] = entry.parent
+                changed.add(entry.name)
+            else:
+                heappush(self.expirations, entry[::-1])
+                changed.add(entry[0])
+
+        del self.journal[keep:]
+        del self.journal_times[keep:]
+
+        return changed
+
+    def _restore(self, checkpoint, keep):
+        # go back to checkpoint, then redo the writes up to the first keep
+        # journal entries; expirations in between are left for the caller's
+        # sweep to pop again
+        redo = [entry for entry in self.journal[checkpoint.journal_length:keep] if type(entry) is File]
+
+        self.filesystem = dict(checkpoint.filesystem)
+        self.live = dict(checkpoint.live)
+        self.names = list(checkpoint.names)
+        self.expirations = list(checkpoint.expirations)
+        del self.journal[checkpoint.journal_length:]
+        del self.journal_times[checkpoint.journal_length:]
+        self.search_cache.clear()
+
+        changed = set()
+        for file in redo:
+            self.filesystem[file.name] = file
+            self.journal.append(file)
+            self.journal_times.append(file.timestamp)
+            if file.expiry != inf:
+                heappush(self.expirations, (file.expiry, file.name))
+            changed.add(file.name)
+
+        # self.live is as of the checkpoint; names it has that were written
+        # since are in changed, and expirations since are still on the heap
+        return changed
+
     def rollback(self, timestamp, ts_str):
-        new_fs = defaultdict(list)
-        for name, files in self.filesystem.items():
-            for file in files:
-                if file.timestamp <= timestamp:
-                    new_fs[name].append(file)
-        
-        self.filesystem = new_fs
+        self._rollback(timestamp)
 
         return f"rollback to {ts_str}"
 
+    def _rollback(self, timestamp):
+        # the journal entries at or before timestamp are kept
+        keep = bisect_right(self.journal_times, timestamp)
+
+        while self.checkpoints and self.checkpoints[-1].clock > timestamp:
+            self.checkpoints.pop()
+
+        checkpoint = self.checkpoints[-1] if self.checkpoints else None
+        undo = len(self.journal) - keep
+
+        # restoring copies the checkpoint's containers at C speed, which is
+        # worth roughly one undone journal entry per CHECKPOINT_RESTORE_RATIO
+        # stored names
+        if checkpoint and (keep - checkpoint.journal_length
+                           + len(checkpoint.filesystem) // CHECKPOINT_RESTORE_RATIO) < undo:
+            changed = self._restore(checkpoint, keep)
+        else:
+            changed = self._undo(keep)
+
+        # versions whose sweep was undone may already be expired at timestamp
+        self.clock = timestamp
+        self._sweep()
+
+        self._unindex([name for name in changed if self._refresh(name)])
+
+
+# opcode -> (FileHost method, whether operation[1] is a timestamp, index in
+# the operation of the method's first argument after the timestamp)
+OPERATIONS = {
+    "FILE_UPLOAD": (FileHost.upload, False, 1),
+    "FILE_UPLOAD_AT": (FileHost.upload, True, 2),
+    "FILE_GET": (FileHost.get, False, 1),
+    "FILE_GET_AT": (FileHost.get, True, 2),
+    "FILE_COPY": (FileHost.copy, False, 1),
+    "FILE_COPY_AT": (FileHost.copy, True, 2),
+    "FILE_SEARCH": (FileHost.search, False, 1),
+    "FILE_SEARCH_AT": (FileHost.search, True, 2),
+    # rollback also needs the timestamp string back for its message
+    "ROLLBACK": (FileHost.rollback, True, 1),
+}
+TS_OPS = [op for op, (_, timestamped, _) in OPERATIONS.items() if timestamped]
+READS = {FileHost.get, FileHost.search}
+
+
+@lru_cache(maxsize=None)
+def operations_for(host_class):
+    # OPERATIONS with each method looked up on a FileHost subclass, so that
+    # process_operations() runs the subclass's overrides; reads only go
+    # through read_batch if the subclass leaves them as they are
+    return {
+        opcode: (getattr(host_class, handler.__name__), timestamped, first_arg)
+        for opcode, (handler, timestamped, first_arg) in OPERATIONS.items()
+    }
+
+
+def process_operations(operations, file_host=None, read_batch_size=1024):
+    """
+    Streams a file hosting session: the generator form of solution().
+    Operations are consumed lazily and results are yielded in order as their
+    operations run, so memory use does not grow with the length of the
+    stream beyond the FileHost state itself.
+
+    Consecutive reads (gets and searches) at one timestamp are held back and
+    run together through FileHost.read_batch, up to read_batch_size at a
+    time; their results are yielded once the run ends. A read_batch_size of
+    1 runs every operation on its own, so each result is yielded before the
+    next operation is read, as an interactive consumer needs.
+
+    Parameters:
+      operations (Iterable[List[str]]): Operations to perform, e.g. from read_operations().
+      file_host (FileHost): Host to run them against; a fresh one by default.
+      read_batch_size (int): Most reads to hold back at once.
+
+    Yields:
+      str: The output message of each operation, in order.
+    """
+    if file_host is None:
+        file_host = FileHost()
+
+    operations_table = OPERATIONS if type(file_host) is FileHost else operations_for(type(file_host))
+    parse = file_host._timestamp_parser()
+
+    last_ts = 0
+    # streams are monotonic, so most operations repeat the previous timestamp
+    last_ts_str = None
+    reads = []
+    reads_ts = None
+    batched = READS if read_batch_size > 1 else ()
+
+    for operation in operations:
+        try:
+            handler, timestamped, first_arg = operations_table[operation[0]]
+        except KeyError:
+            raise ValueError(f"Unknown operation: {operation[0]}") from None
+
+        if timestamped and operation[1] != last_ts_str:
+            last_ts_str = operation[1]
+            last_ts = parse(last_ts_str)
+
+        if handler in batched:
+            if reads and (last_ts != reads_ts or len(reads) >= read_batch_size):
+                yield from file_host.read_batch(reads_ts, reads)
+                reads = []
+
+            reads.append((handler, operation[first_arg:]))
+            reads_ts = last_ts
+            continue
+
+        if reads:
+            yield from file_host.read_batch(reads_ts, reads)
+            reads = []
+
+        yield handler(file_host, last_ts, *operation[first_arg:])
+
+    if reads:
+        yield from file_host.read_batch(reads_ts, reads)
+
+
+def read_operations(lines):
+    """
+    Parses operations from newline-delimited JSON, one array of strings per
+    line, e.g. ["FILE_UPLOAD_AT", "2022-01-01T00:00:00", "a.txt", "1kb"].
+    Blank lines are skipped. Works on any iterable of lines, such as an open
+    file, without reading it all up front.
+    """
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
 
 def solution(operations):
     """
@@ -95,31 +593,13 @@ def solution(operations):
     Returns:
       List[str]: A list of output messages corresponding to each operation.
     """
-    file_host = FileHost()
-    results = []
-    last_ts = 0
+    return list(process_operations(operations))
 
-    for operation in operations:
-        operation_type = operation[0]
-        args = operation[1:]
-
-        if operation_type in TS_OPS:
-            last_ts = datetime.strptime(args[0], "%Y-%m-%dT%H:%M:%S").timestamp()
-            args = args[1:]
-
-        match operation_type:
-            case "FILE_UPLOAD" | "FILE_UPLOAD_AT":
-                result = file_host.upload(last_ts, *args)
-            case "FILE_GET" | "FILE_GET_AT":
-                result = file_host.get(last_ts, *args)
-            case "FILE_COPY" | "FILE_COPY_AT":
-                result = file_host.copy(last_ts, *args)
-            case "FILE_SEARCH" | "FILE_SEARCH_AT":
-                result = file_host.search(last_ts, *args)
-            case "ROLLBACK":
-                ts_str = operation[1]
-                result = file_host.rollback(last_ts, ts_str)
-        
-        results.append(result)
-    
-    return results
\ No newline at end of file
+
+if __name__ == "__main__":
+    # python3 solution.py trace.jsonl > results.txt (reads stdin without a path)
+    # stdin may be typed or piped in a line at a time, so its reads are not
+    # held back for a batch that might not fill until EOF
+    with open(sys.argv[1]) if len(sys.argv) > 1 else sys.stdin as trace:
+        for result in process_operations(read_operations(trace), read_batch_size=1024 if len(sys.argv) > 1 else 1):
+            print(result, flush=trace is sys.stdin)
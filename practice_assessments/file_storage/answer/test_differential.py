@@ -0,0 +1,26 @@
+import unittest
+
+from answer_import import import_answer
+
+differential, solution = import_answer("differential", "solution")
+ENGINES, check = differential.ENGINES, differential.check
+
+
+class DifferentialTest(unittest.TestCase):
+    def test_engines_agree_with_reference(self):
+        for name, engine in ENGINES.items():
+            with self.subTest(engine=name):
+                self.assertIsNone(check(engine, seeds=range(20), length=150))
+
+    def test_size_parsing_regression_is_caught(self):
+        # an engine that reads "1kb" and "1KB" as 1 byte
+        parse_size = solution.parse_size
+        solution.parse_size = lambda size: parse_size(size.rstrip("bkmgtBKMGT") or "0")
+        try:
+            self.assertIsNotNone(check(solution.solution, seeds=range(20), length=150))
+        finally:
+            solution.parse_size = parse_size
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from answer_import import import_answer
+
+server, solution = import_answer("server", "solution")
+FileHostServer, FileHost = server.FileHostServer, solution.FileHost
+
+
+class ServerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "server.sock")
+        self.server = asyncio.create_task(FileHostServer().serve(path=self.path))
+        while not os.path.exists(self.path):
+            await asyncio.sleep(0.01)
+        self.writers = []
+
+    async def asyncTearDown(self):
+        # let the server see every client go before it stops
+        for writer in self.writers:
+            writer.close()
+            await writer.wait_closed()
+        await asyncio.sleep(0.01)
+        self.server.cancel()
+        try:
+            await self.server
+        except asyncio.CancelledError:
+            pass
+        self.directory.cleanup()
+
+    async def connect(self):
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        self.writers.append(writer)
+        return reader, writer
+
+    async def send(self, connection, *operations):
+        # sends operations in one write, then reads back one result each
+        reader, writer = connection
+        writer.write(b"".join(json.dumps(operation).encode() + b"\n" for operation in operations))
+        await writer.drain()
+        return [json.loads(await reader.readline()) for _ in operations]
+
+    async def test_late_timestamp_is_refused(self):
+        first, second = await self.connect(), await self.connect()
+
+        self.assertEqual(await self.send(first, ["FILE_UPLOAD_AT", "2022-01-01T12:00:10", "a", "1kb"]),
+                         ["uploaded a"])
+        # stamped before the upload above, which has already run
+        late, = await self.send(second, ["FILE_UPLOAD_AT", "2022-01-01T12:00:05", "b", "1kb"])
+        self.assertIn("error", late)
+
+        self.assertEqual(await self.send(second,
+                                         ["ROLLBACK", "2022-01-01T12:00:07"],
+                                         ["FILE_SEARCH_AT", "2022-01-01T12:00:07", ""]),
+                         ["rollback to 2022-01-01T12:00:07", "found []"])
+        # after the rollback, timestamps from its target on are accepted
+        self.assertEqual(await self.send(first, ["FILE_UPLOAD_AT", "2022-01-01T12:00:08", "a", "1kb"]),
+                         ["uploaded a"])
+
+    async def test_one_turn_runs_in_timestamp_order(self):
+        # requests from two connections that arrive in the same engine turn
+        # are sorted rather than refused
+        server = FileHostServer()
+        futures = [
+            server.submit(b'["FILE_UPLOAD_AT", "2022-01-01T12:00:10", "a", "1kb"]'),
+            server.submit(b'["FILE_UPLOAD_AT", "2022-01-01T12:00:05", "b", "1kb", "4"]'),
+            server.submit(b'["FILE_SEARCH_AT", "2022-01-01T12:00:10", ""]'),
+        ]
+        server._run(server._order(server.requests))
+
+        self.assertEqual([future.result() for future in futures], ["uploaded a", "uploaded b", "found [a]"])
+
+
+    async def test_malformed_read_fails_alone(self):
+        server = FileHostServer()
+        server.submit(b'["FILE_UPLOAD_AT", "2022-01-01T12:00:00", "a", "1kb"]')
+        futures = [
+            server.submit(b'["FILE_GET_AT", "2022-01-01T12:00:00"]'),
+            server.submit(b'["FILE_GET_AT", "2022-01-01T12:00:00", "a"]'),
+            server.submit(b'["FILE_SEARCH_AT", "2022-01-01T12:00:00", ""]'),
+        ]
+        server._run(server._order(server.requests))
+
+        with self.assertRaises(ValueError):
+            futures[0].result()
+        self.assertEqual([future.result() for future in futures[1:]], ["got a", "found [a]"])
+
+    async def test_failed_batch_runs_reads_one_at_a_time(self):
+        class BatchFails(FileHost):
+            def read_batch(self, timestamp, reads):
+                raise RuntimeError("read_batch failed")
+
+        server = FileHostServer(BatchFails())
+        server.submit(b'["FILE_UPLOAD_AT", "2022-01-01T12:00:00", "a", "1kb"]')
+        futures = [
+            server.submit(b'["FILE_SEARCH_AT", "2022-01-01T12:00:00", ""]'),
+            server.submit(b'["FILE_GET_AT", "2022-01-01T12:00:00", "a"]'),
+        ]
+        server._run(server._order(server.requests))
+
+        self.assertEqual([future.result() for future in futures], ["found [a]", "got a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
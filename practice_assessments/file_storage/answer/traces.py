@@ -0,0 +1,117 @@
+"""
+Seeded synthetic traces in the FILE_*_AT / ROLLBACK grammar.
+
+Names live in directories, "d<dir>/f<file>.bin", and prefix_skew makes a
+few directories hot: directory k is picked with weight 1 / (k + 1) **
+prefix_skew, for writes, reads and searches alike. Searches are for a whole
+directory or a part of a file name in it.
+
+Run from this directory:
+  python3 traces.py --length 100000 --seed 1 > trace.jsonl
+  python3 solution.py trace.jsonl > results.txt
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from solution import TIMESTAMP_FORMAT
+
+
+# operation -> relative weight
+DEFAULT_MIX = {
+    "FILE_UPLOAD_AT": 30,
+    "FILE_GET_AT": 40,
+    "FILE_COPY_AT": 15,
+    "FILE_SEARCH_AT": 14,
+    "ROLLBACK": 1,
+}
+# (ttl in seconds, or None for none) -> relative weight
+DEFAULT_TTLS = {None: 50, 60: 20, 3600: 30}
+SIZE_SUFFIXES = ("b", "kb", "mb", "gb")
+
+
+def generate_trace(length, seed=0, mix=None, names=10_000, directories=100, prefix_skew=1.0,
+                   ttls=None, rollback_depth=600, ops_per_second=10):
+    """
+    Builds a reproducible list of operations for solution().
+
+    Parameters:
+      length (int): Number of operations.
+      seed (int): Seed for the random choices; equal arguments give equal traces.
+      mix (Dict[str, float]): Operation -> relative weight, DEFAULT_MIX by
+        default; ROLLBACK's weight sets the rollback frequency.
+      names (int): Number of distinct file names.
+      directories (int): Number of directories the names are spread over.
+      prefix_skew (float): Zipf exponent for picking a directory; 0 is uniform.
+      ttls (Dict[Optional[int], float]): TTL -> relative weight for uploads,
+        DEFAULT_TTLS by default.
+      rollback_depth (int): Most seconds a ROLLBACK goes back.
+      ops_per_second (int): Operations per tick of the clock.
+
+    Returns:
+      List[List[str]]: The operations.
+    """
+    rng = random.Random(seed)
+    mix = DEFAULT_MIX if mix is None else mix
+    ttls = DEFAULT_TTLS if ttls is None else ttls
+
+    operations, operation_weights = list(mix), list(accumulate(mix.values()))
+    ttl_choices, ttl_weights = list(ttls), list(accumulate(ttls.values()))
+    directory_weights = list(accumulate(1 / (k + 1) ** prefix_skew for k in range(directories)))
+    per_directory = max(1, names // directories)
+
+    def pick_name():
+        directory, = rng.choices(range(directories), cum_weights=directory_weights)
+        return f"d{directory}/f{rng.randrange(per_directory)}.bin"
+
+    start = datetime(2022, 1, 1)
+    second = 0
+    trace = []
+    for i in range(length):
+        if i and i % ops_per_second == 0:
+            second += 1
+        ts = (start + timedelta(seconds=second)).strftime(TIMESTAMP_FORMAT)
+
+        operation, = rng.choices(operations, cum_weights=operation_weights)
+        if operation == "FILE_UPLOAD_AT":
+            size = f"{rng.randint(1, 999)}{rng.choice(SIZE_SUFFIXES)}"
+            ttl, = rng.choices(ttl_choices, cum_weights=ttl_weights)
+            trace.append([operation, ts, pick_name(), size] + ([str(ttl)] if ttl else []))
+        elif operation == "FILE_COPY_AT":
+            trace.append([operation, ts, pick_name(), pick_name()])
+        elif operation == "FILE_SEARCH_AT":
+            name = pick_name()
+            trace.append([operation, ts, name[:rng.randint(name.index("/") + 1, len(name))]])
+        elif operation == "ROLLBACK":
+            # later operations carry on from the rollback's target
+            second = max(0, second - rng.randint(1, rollback_depth))
+            trace.append([operation, (start + timedelta(seconds=second)).strftime(TIMESTAMP_FORMAT)])
+        else:
+            trace.append([operation, ts, pick_name()])
+
+    return trace
+
+
+def parse_ttls(text):
+    # '{"null": 50, "60": 20}' -> {None: 50, 60: 20}; JSON keys are strings
+    return {None if ttl in ("null", "none", "") else int(ttl): weight for ttl, weight in json.loads(text).items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--length", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--names", type=int, default=10_000)
+    parser.add_argument("--directories", type=int, default=100)
+    parser.add_argument("--prefix-skew", type=float, default=1.0)
+    parser.add_argument("--rollback-depth", type=int, default=600)
+    parser.add_argument("--ops-per-second", type=int, default=10)
+    parser.add_argument("--mix", type=json.loads, help='e.g. \'{"FILE_GET_AT": 9, "FILE_UPLOAD_AT": 1}\'')
+    parser.add_argument("--ttls", type=parse_ttls, help='TTL -> weight, "null" for none, e.g. \'{"null": 1, "60": 1}\'')
+    options = parser.parse_args()
+
+    for operation in generate_trace(options.length, options.seed, options.mix, options.names, options.directories,
+                                    options.prefix_skew, options.ttls, options.rollback_depth, options.ops_per_second):
+        print(json.dumps(operation))
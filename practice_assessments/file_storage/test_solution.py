@@ -61,6 +61,14 @@ class Level1(unittest.TestCase):
             "got FileY.txt"
         ])
 
+    def test_unknown_operation(self):
+        test_data = [
+            ["FILE_UPLOAD", "Known.txt", "100kb"],
+            ["FILE_DELETE", "Known.txt"]
+        ]
+        with self.assertRaises(ValueError):
+            solution(test_data)
+
 # Level 2: Data processing (FILE_SEARCH) and ordering
 class Level2(unittest.TestCase):
     def test_search_ordering(self):
@@ -80,6 +88,23 @@ class Level2(unittest.TestCase):
             "found [Alpine.txt, Alphabet.txt, Alpha.txt]"
         ])
 
+    def test_search_orders_by_bytes(self):
+        test_data = [
+            ["FILE_UPLOAD", "Small.txt", "900kb"],
+            ["FILE_UPLOAD", "Big.txt", "1mb"],
+            ["FILE_UPLOAD", "Tiny.txt", "99kb"],
+            ["FILE_UPLOAD", "Bytes.txt", "2000"],
+            ["FILE_SEARCH", ""]
+        ]
+        output = solution(test_data)
+        self.assertEqual(output, [
+            "uploaded Small.txt",
+            "uploaded Big.txt",
+            "uploaded Tiny.txt",
+            "uploaded Bytes.txt",
+            "found [Big.txt, Small.txt, Tiny.txt, Bytes.txt]"
+        ])
+
     def test_additional_search(self):
         test_data = [
             ["FILE_UPLOAD", "Search1.txt", "80kb"],
@@ -0,0 +1,159 @@
+"""
+Micro-benchmarks for the TaskManager reference answer.
+
+Run from this directory:
+  python3 benchmark.py            # every benchmark
+  python3 benchmark.py titles     # only the named benchmark(s)
+"""
+import random
+import sys
+import time
+import tracemalloc
+
+from solution import TaskManager
+
+
+def _timeit(fn, repeat):
+   start = time.perf_counter()
+   for _ in range(repeat):
+      fn()
+   return (time.perf_counter() - start) / repeat
+
+
+def bench_titles(sizes=(1_000, 10_000, 100_000, 1_000_000), duplicates=100, repeat=10_000):
+   # every title is shared by `duplicates` tasks, and the one looked up was
+   # added last, so a scan would have to pass every other task first
+   print(f"title lookup latency vs. task count ({duplicates} tasks per title)")
+   for total in sizes:
+      mgr = TaskManager()
+      for i in range(total):
+         mgr.add_task(f"task{i % (total // duplicates)}", "description")
+      mgr.add_task("last", "description")
+
+      get = _timeit(lambda: mgr.get_task("last"), repeat)
+      duplicate = _timeit(lambda: mgr.get_task("task0"), repeat)
+
+      # updating the first task titled task0 sends it to the back, so every
+      # update hits a different one of its duplicates
+      def update():
+         mgr.update_task("task0", "task0", "updated")
+      churn = _timeit(update, repeat)
+
+      print(f"  {total:>9} tasks: get {get * 1e6:6.2f} us, get duplicate {duplicate * 1e6:6.2f} us, "
+            f"update duplicate {churn * 1e6:6.2f} us")
+
+
+def bench_search(sizes=(1_000, 10_000, 100_000), matches=10, repeat=1_000):
+   # the number of matching tasks stays fixed while the rest of the corpus
+   # grows, so a selective search should stay flat; a broad one cannot
+   print(f"search_tasks latency vs. task count ({matches} matching tasks)")
+   for total in sizes:
+      mgr = TaskManager()
+      for i in range(total - matches):
+         mgr.add_task(f"Task {i}", f"Routine chore number {i} on the weekly list")
+      for i in range(matches):
+         mgr.add_task(f"Quarterly review {i}", "Prepare the budget spreadsheet")
+
+      selective = _timeit(lambda: mgr.search_tasks("budget"), repeat)
+      broad = _timeit(lambda: mgr.search_tasks("weekly"), max(1, repeat * 1_000 // total))
+      print(f"  {total:>9} tasks: selective {selective * 1e6:9.2f} us, broad {broad * 1e3:8.2f} ms")
+
+
+def bench_dashboard(total=100_000, repeat=10):
+   # a read-heavy dashboard: render every task, then run a search that
+   # matches all of them, with a few tasks changing in between
+   print(f"dashboard refresh over {total} tasks")
+   mgr = TaskManager()
+   for i in range(total):
+      mgr.add_task(f"Task {i}", f"Routine chore number {i} on the weekly list", "2024-01-31")
+      mgr.set_priority(i, "high")
+
+   def refresh():
+      for task_id in range(0, total, 1_000):
+         mgr.complete_task(task_id)
+      for task_id in mgr.tasks:
+         mgr.get_task_by_id(task_id)
+
+   render = _timeit(refresh, repeat)
+   search = _timeit(lambda: mgr.search_tasks("weekly"), repeat)
+   print(f"  render all: {render * 1e3:8.2f} ms")
+   print(f"  broad search: {search * 1e3:8.2f} ms")
+
+
+def bench_filters(sizes=(1_000, 10_000, 100_000), matches=10, repeat=1_000):
+   # only a few tasks pass each filter while the rest of the list grows, so
+   # each listing should stay flat
+   print(f"filtered listing latency vs. task count ({matches} matching tasks)")
+   for total in sizes:
+      mgr = TaskManager()
+      for i in range(total):
+         mgr.add_task(f"Task {i}", "description", "2024-06-01")
+         mgr.complete_task(i)
+      for i in range(total - matches, total):
+         mgr.set_priority(i, "high")
+      for i in range(matches):
+         mgr.add_task(f"Late {i}", "description", "2024-01-01")
+
+      priority = _timeit(lambda: mgr.list_tasks("high"), repeat)
+      incomplete = _timeit(mgr.list_incomplete_tasks, repeat)
+      overdue = _timeit(lambda: mgr.list_overdue_tasks("2024-02-01"), repeat)
+      print(f"  {total:>9} tasks: priority {priority * 1e6:8.2f} us, incomplete {incomplete * 1e6:8.2f} us, "
+            f"overdue {overdue * 1e6:8.2f} us")
+
+
+def bench_updates(sizes=(10_000, 100_000, 1_000_000), updates=100_000, seed=0):
+   # a stream of updates to random tasks in a large list where every task
+   # has a priority and a due date and half of them are completed
+   print(f"update_task_by_id throughput vs. task count ({updates} updates)")
+   rng = random.Random(seed)
+   for total in sizes:
+      mgr = TaskManager()
+      for i in range(total):
+         mgr.add_task(f"Task {i}", f"Routine chore number {i} on the weekly list", f"2024-{i % 12 + 1:02d}-01")
+         mgr.set_priority(i, ("low", "medium", "high")[i % 3])
+         if i % 2:
+            mgr.complete_task(i)
+
+      stream = [(rng.randrange(total), f"Task {i % 1000}", f"Chore revised {i % 7} times") for i in range(updates)]
+
+      def update():
+         for task_id, title, description in stream:
+            mgr.update_task_by_id(task_id, title, description)
+
+      latency = _timeit(update, 1) / updates
+      print(f"  {total:>9} tasks: {latency * 1e6:8.2f} us/update")
+
+
+def bench_memory(total=100_000):
+   # what the indexes cost in memory, and in time on every add
+   print(f"memory held by {total} tasks, and add_task latency")
+   def fill():
+      mgr = TaskManager()
+      for i in range(total):
+         mgr.add_task(f"Task {i}", f"Routine chore number {i} on the weekly list", "2024-01-31")
+      return mgr
+
+   tracemalloc.start()
+   mgr = fill()
+   held, _ = tracemalloc.get_traced_memory()
+   tracemalloc.stop()
+   del mgr
+
+   latency = _timeit(fill, 1) / total
+   print(f"  {held / total:8.1f} bytes/task")
+   print(f"  {latency * 1e6:8.2f} us/add")
+
+
+BENCHMARKS = {
+   "titles": bench_titles,
+   "search": bench_search,
+   "dashboard": bench_dashboard,
+   "filters": bench_filters,
+   "updates": bench_updates,
+   "memory": bench_memory,
+}
+
+
+if __name__ == "__main__":
+   for name in sys.argv[1:] or BENCHMARKS:
+      BENCHMARKS[name]()
@@ -1,22 +1,86 @@
+from bisect import bisect_left, insort
 from collections import OrderedDict
 from datetime import datetime
 
 
 DATE_FORMAT = "%Y-%m-%d"
 
+# a trigram in more than one task in COMMON_SHARE (and in more than
+# COMMON_MIN tasks) narrows a search down too little to beat a scan
+COMMON_SHARE = 8
+COMMON_MIN = 64
+
+def _trigrams(text):
+   # every run of three characters in text that does not span a newline
+   return {line[i:i + 3] for line in text.split("\n") for i in range(len(line) - 2)}
+
 class Task:
+   __slots__ = ("title", "description", "due_date", "priority", "completed",
+                "text", "rendered")
+
    def __init__(self, title, description, due_date = None):
       self.title = title
       self.description = description
       self.due_date = due_date
       self.priority = None
       self.completed = False
+      # what search_tasks matches against: no keyword without a newline can
+      # match across the one between title and description
+      self.text = f"{title}\n{description}".lower()
+      # get_task_by_id's output, built on first use; whatever changes the
+      # task must reset it to None
+      self.rendered = None
+
+   def rename(self, title, description):
+      self.title = title
+      self.description = description
+      self.text = f"{title}\n{description}".lower()
+      self.rendered = None
+
+   def render(self):
+      if self.rendered is None:
+         suffix = ""
+         if self.completed:
+            suffix += ", completed: True"
+         if self.priority:
+            suffix += f", priority: {self.priority}"
+         if self.due_date:
+            suffix += f", due date: {self.due_date.strftime(DATE_FORMAT)}"
+
+         self.rendered = f"{self.title}, {self.description}" + suffix
+
+      return self.rendered
 
 
 class TaskManager:
    def __init__(self):
       self.tasks = OrderedDict()
       self.last_id = -1
+      # title -> OrderedDict of the ids of tasks with that title, in the same
+      # order as self.tasks, so the first one is the first match of a scan
+      self.titles = {}
+      # trigram of a lowercased title or description -> ids of the tasks
+      # it appears in, to narrow down search_tasks. Common trigrams are not
+      # kept, as their ids would take most of the memory and never help; the
+      # index is rebuilt once the task count has grown COMMON_SHARE-fold
+      # since the first one went, in case some are no longer common
+      self.trigrams = {}
+      self.common_trigrams = set()
+      self.reindex_at = None
+      # task id -> when it was last inserted, to put search results back
+      # in the order of self.tasks
+      self.positions = {}
+      self.inserted = 0
+      # priority -> OrderedDict of the ids of the tasks with it
+      self.priorities = {}
+      # priorities whose ids are no longer in the order of self.tasks,
+      # because a task got one after tasks behind it did; list_tasks sorts
+      # them again
+      self.unsorted_priorities = set()
+      # ids of the tasks not completed yet, in the order of self.tasks
+      self.incomplete = OrderedDict()
+      # [(due date, id)] of the tasks with a due date, sorted
+      self.due_dates = []
 
    def add_task(self, title, description, due_date=None):
       if not title or not description:
@@ -29,7 +93,7 @@ class TaskManager:
             raise ValueError("Invalid date format. Use YYYY-MM-DD")
 
       self.last_id += 1  
-      self.tasks[self.last_id] = Task(title, description, due_date)
+      self._insert(self.last_id, Task(title, description, due_date))
 
       return f"task added: {title}"
 
@@ -39,29 +103,120 @@ class TaskManager:
    def list_tasks(self, priority = None):
       if priority:
          self._validate_priority(priority)
-         titles = [task.title for task in self.tasks.values() if task.priority is priority]
+         if priority in self.unsorted_priorities:
+            self.unsorted_priorities.discard(priority)
+            self.priorities[priority] = OrderedDict.fromkeys(sorted(self.priorities[priority], key=self.positions.__getitem__))
+         titles = [self.tasks[task_id].title for task_id in self.priorities.get(priority, ())]
       else:
          titles = [task.title for task in self.tasks.values()]
 
       return f"[{', '.join(titles)}]"
 
+   def _insert(self, task_id, task):
+      # task is new: it has no priority and is not completed yet. task_id
+      # goes last, both in self.tasks and among tasks titled the same
+      self.tasks[task_id] = task
+      self.titles.setdefault(task.title, OrderedDict())[task_id] = None
+
+      self.inserted += 1
+      self.positions[task_id] = self.inserted
+      if self.reindex_at is not None and len(self.tasks) >= self.reindex_at:
+         self._reindex_trigrams()
+      else:
+         self._index_trigrams(task_id, _trigrams(task.text))
+
+      # every insert has the highest position yet, so appending keeps
+      # self.incomplete in order
+      self.incomplete[task_id] = None
+      if task.due_date:
+         insort(self.due_dates, (task.due_date, task_id))
+
+   def _remove(self, task_id):
+      task = self.tasks.pop(task_id)
+      ids = self.titles[task.title]
+      del ids[task_id]
+      if not ids:
+         del self.titles[task.title]
+
+      del self.positions[task_id]
+      self._unindex_trigrams(task_id, _trigrams(task.text))
+
+      if task.priority:
+         self._unprioritize(task.priority, task_id)
+      if not task.completed:
+         del self.incomplete[task_id]
+      if task.due_date:
+         del self.due_dates[bisect_left(self.due_dates, (task.due_date, task_id))]
+
+   def _index_trigrams(self, task_id, trigrams):
+      postings = self.trigrams
+      for trigram in trigrams - self.common_trigrams:
+         ids = postings.get(trigram)
+         if ids is None:
+            postings[trigram] = {task_id}
+            continue
+
+         ids.add(task_id)
+         if len(ids) > COMMON_MIN and len(ids) * COMMON_SHARE > len(self.tasks):
+            del postings[trigram]
+            self.common_trigrams.add(trigram)
+            if self.reindex_at is None:
+               self.reindex_at = COMMON_SHARE * len(self.tasks)
+
+   def _unindex_trigrams(self, task_id, trigrams):
+      postings = self.trigrams
+      for trigram in trigrams - self.common_trigrams:
+         ids = postings[trigram]
+         ids.discard(task_id)
+         if not ids:
+            del postings[trigram]
+
+   def _reindex_trigrams(self):
+      self.trigrams = {}
+      self.common_trigrams = set()
+      self.reindex_at = None
+      for task_id, task in self.tasks.items():
+         self._index_trigrams(task_id, _trigrams(task.text))
+
+   def _move_to_end(self, task_id, task):
+      # what _remove and then _insert would do to the place of task_id in
+      # every ordered index, done in place; self.due_dates is sorted by
+      # date, and does not change
+      self.inserted += 1
+      self.positions[task_id] = self.inserted
+
+      self.tasks.move_to_end(task_id)
+      self.titles[task.title].move_to_end(task_id)
+      if task.priority:
+         self.priorities[task.priority].move_to_end(task_id)
+      if not task.completed:
+         self.incomplete.move_to_end(task_id)
+
+   def _prioritize(self, priority, task_id):
+      ids = self.priorities.setdefault(priority, OrderedDict())
+      if ids and self.positions[next(reversed(ids))] > self.positions[task_id]:
+         self.unsorted_priorities.add(priority)
+      ids[task_id] = None
+
+   def _unprioritize(self, priority, task_id):
+      ids = self.priorities[priority]
+      del ids[task_id]
+      if not ids:
+         del self.priorities[priority]
+         self.unsorted_priorities.discard(priority)
+
    def _title_to_id(self, title):
       if not title:
          raise ValueError("Invalid task data: parameters must not be empty")
       
-      task_id = None
+      ids = self.titles.get(title)
 
-      for id, task in self.tasks.items():
-         if task.title == title:
-            task_id = id
-            break
-      
       # not strictly necessary because we always catch
       # it in _get_task_by_id below
-      if task_id is None:
+      if not ids:
          raise KeyError("Task not found")
 
-      return task_id
+      return next(iter(ids))
 
    def _get_task_by_id(self, task_id):
       task = self.tasks.get(task_id)
@@ -77,26 +232,30 @@ class TaskManager:
       return self.get_task_by_id(task_id)
    
    def get_task_by_id(self, task_id):
-      task = self._get_task_by_id(task_id)
-
-      suffix = ""
-      if task.completed:
-         suffix += ", completed: True"
-      if task.priority:
-         suffix += f", priority: {task.priority}"
-      if task.due_date:
-         suffix += f", due date: {task.due_date.strftime(DATE_FORMAT)}"
-      
-      return f"{task.title}, {task.description}" + suffix
+      return self._get_task_by_id(task_id).render()
       
    def _update_task_by_id(self, task_id, new_title, new_description):
       if not new_title or not new_description:
          raise ValueError("Invalid task data: parameters must not be empty")
       
-      self._get_task_by_id(task_id) # throws if task does not exist
-      
-      del self.tasks[task_id] # for ordering
-      self.tasks[task_id] = Task(new_title, new_description)
+      task = self._get_task_by_id(task_id) # throws if task does not exist
+
+      # an updated task counts as deleted and re-added, so it goes to the
+      # back, but it keeps its priority, completion and due date
+      self._move_to_end(task_id, task)
+
+      if new_title != task.title:
+         ids = self.titles[task.title]
+         del ids[task_id]
+         if not ids:
+            del self.titles[task.title]
+         self.titles.setdefault(new_title, OrderedDict())[task_id] = None
+
+      old_trigrams = _trigrams(task.text)
+      task.rename(new_title, new_description)
+      new_trigrams = _trigrams(task.text)
+      self._unindex_trigrams(task_id, old_trigrams - new_trigrams)
+      self._index_trigrams(task_id, new_trigrams - old_trigrams)
 
       return "task updated: "
 
@@ -111,7 +270,7 @@ class TaskManager:
    def _delete_task_by_id(self, task_id):
       self._get_task_by_id(task_id) # throws if task does not exist
       
-      del self.tasks[task_id]
+      self._remove(task_id)
       return "task deleted: "
 
    def delete_task(self, title):
@@ -123,11 +282,15 @@ class TaskManager:
       return self._delete_task_by_id(task_id) + str(task_id)
    
    def complete_task(self, task_id):
-     self._get_task_by_id(task_id).completed = True
+     task = self._get_task_by_id(task_id)
+     if not task.completed:
+        del self.incomplete[task_id]
+     task.completed = True
+     task.rendered = None
      return f"task completed: {task_id}"
    
    def list_incomplete_tasks(self):
-      titles = [task.title for task in self.tasks.values() if not task.completed]
+      titles = [self.tasks[task_id].title for task_id in self.incomplete]
       return f"[{', '.join(titles)}]"
    
    def list_overdue_tasks(self, reference_date):
@@ -136,12 +299,35 @@ class TaskManager:
       except ValueError:
          raise ValueError("Invalid date format. Use YYYY-MM-DD")
       
-      titles = [task.title for task in self.tasks.values() if task.due_date and task.due_date < reference_date]
+      # the overdue tasks are a prefix of self.due_dates, which only needs
+      # putting back into the order of self.tasks
+      overdue = sorted((task_id for _, task_id in self.due_dates[:bisect_left(self.due_dates, (reference_date,))]),
+                       key=self.positions.__getitem__)
+      titles = [self.tasks[task_id].title for task_id in overdue]
       return f"[{', '.join(titles)}]"
     
    def search_tasks(self, keyword):
       keyword = keyword.lower()
-      titles = [task.title for task in self.tasks.values() if keyword in task.title.lower() or keyword in task.description.lower()]
+
+      # only tasks that have every trigram of the keyword can contain it;
+      # intersecting from the rarest trigram keeps that cheap. Common
+      # trigrams are not indexed, and are left to the check below
+      postings = sorted((self.trigrams.get(trigram, ()) for trigram in _trigrams(keyword)
+                         if trigram not in self.common_trigrams), key=len)
+
+      if not postings or len(postings[0]) * COMMON_SHARE > len(self.tasks):
+         # the keyword is too short or too common for the index to narrow
+         # down much, and checking every task in order is cheaper
+         tasks = self.tasks.values()
+      else:
+         candidates = set(postings[0]).intersection(*postings[1:])
+         tasks = [self.tasks[task_id] for task_id in sorted(candidates, key=self.positions.__getitem__)]
+
+      if "\n" in keyword:
+         titles = [task.title for task in tasks
+                   if keyword in task.title.lower() or keyword in task.description.lower()]
+      else:
+         titles = [task.title for task in tasks if keyword in task.text]
       return f"[{', '.join(titles)}]"
    
    def _validate_priority(self, priority):
@@ -150,7 +336,13 @@ class TaskManager:
 
    def set_priority(self, task_id, priority):
       self._validate_priority(priority)
-      self._get_task_by_id(task_id).priority = priority
+      task = self._get_task_by_id(task_id)
+      if task.priority != priority:
+         if task.priority:
+            self._unprioritize(task.priority, task_id)
+         self._prioritize(priority, task_id)
+      task.priority = priority
+      task.rendered = None
 
       return f"priority set: {task_id}"
 
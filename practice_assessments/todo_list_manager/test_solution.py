@@ -735,6 +735,27 @@ class Level4(Level3):
         info2 = self.mgr.get_task("MultiField")
         self.assertEqual(info2, "MultiField, Full test, completed: True, priority: high, due date: 2030-01-02")
 
+    def test_update_task_keeps_all_fields(self):
+        """
+        Updating a task changes its title and description and moves it to the end,
+        but keeps its completion status, priority and due date.
+        """
+        result = self.mgr.add_task_by_id("Old", "Old desc", "2030-01-02")
+        id_val = int(result.split("id: ")[1])
+        self.mgr.add_task_by_id("Other", "Other desc")
+        self.mgr.complete_task(id_val)
+        self.mgr.set_priority(id_val, "low")
+
+        self.mgr.update_task_by_id(id_val, "New", "New desc")
+        self.assertEqual(self.mgr.get_task_by_id(id_val), "New, New desc, completed: True, priority: low, due date: 2030-01-02")
+        self.assertEqual(self.mgr.list_tasks(), "[Other, New]")
+        self.assertEqual(self.mgr.list_tasks("low"), "[New]")
+        self.assertEqual(self.mgr.list_incomplete_tasks(), "[Other]")
+        self.assertEqual(self.mgr.list_overdue_tasks("2030-01-03"), "[New]")
+
+        self.mgr.update_task("New", "Newer", "Newer desc")
+        self.assertEqual(self.mgr.get_task("Newer"), "Newer, Newer desc, completed: True, priority: low, due date: 2030-01-02")
+
 
 if __name__ == "__main__":
     unittest.main()